@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -72,13 +73,108 @@ WSGI_APPLICATION = 'service_track.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# DATABASE_BACKEND=sqlite — файл SQLITE_PATH в режиме WAL (по умолчанию)
+# DATABASE_BACKEND=postgresql — сервер POSTGRES_*; нужен пакет psycopg, для POSTGRES_POOL=1 — psycopg[pool]
+# Проверка профиля на рабочей БД: python manage.py check --database default (см. service_track_app/checks.py)
+
+DATABASE_BACKEND = os.environ.get('DATABASE_BACKEND', 'sqlite')
+# Сколько секунд воркер держит соединение между запросами (0 — новое соединение на каждый запрос)
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+
+if DATABASE_BACKEND == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'service_track'),
+            'USER': os.environ.get('POSTGRES_USER', 'service_track'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            # Оборванное постоянное соединение заменяется новым в начале запроса, а не ошибкой
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('POSTGRES_POOL') == '1':
+        # Пул соединений psycopg в каждом воркере; с постоянными соединениями Django не совмещается
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('POSTGRES_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.environ.get('POSTGRES_POOL_TIMEOUT', 10)),
+        }
+    if os.environ.get('POSTGRES_PGBOUNCER') == '1':
+        # PgBouncer в режиме transaction: серверные курсоры (.iterator() в выгрузке) не живут между транзакциями
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'OPTIONS': {
+                # busy timeout: запись ждёт освобождения блокировки до N секунд, а не падает с «database is locked»
+                'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 20)),
+                # Транзакция сразу берёт блокировку записи. Иначе транзакция, которая сначала читала,
+                # при первой записи получает «database is locked» сразу, без ожидания busy timeout
+                'transaction_mode': 'IMMEDIATE',
+                # WAL: читатели не блокируют писателя и наоборот; synchronous=NORMAL в WAL не теряет
+                # целостность, только последние транзакции при отключении питания; mmap — чтение без копирования
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))};"
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
+    }
+
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# CACHE_BACKEND=locmem — кэш в памяти процесса (по умолчанию)
+# CACHE_BACKEND=file — общий файловый кэш для нескольких воркеров gunicorn
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+        }
     }
-}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'service-track',
+        }
+    }
+
+# Время жизни кэша страницы отслеживания (секунды)
+TRACKING_CACHE_TIMEOUT = int(os.environ.get('TRACKING_CACHE_TIMEOUT', 60 * 15))
+
+# Время жизни результатов автодополнения товаров (секунды)
+PRODUCT_AUTOCOMPLETE_CACHE_TIMEOUT = int(os.environ.get('PRODUCT_AUTOCOMPLETE_CACHE_TIMEOUT', 60))
+
+# Время жизни готовых актов DOCX в кэше (секунды); ключ меняется при любом изменении данных акта
+ACT_CACHE_TIMEOUT = int(os.environ.get('ACT_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Число процессов для пакетной генерации актов (ZIP по пакету)
+ACT_RENDER_WORKERS = int(os.environ.get('ACT_RENDER_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Строк заявок за один запрос к БД при выгрузке CSV/XLSX
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# Архив заявок: закрытые и отклонённые заявки без изменений дольше REQUEST_ARCHIVE_AFTER_DAYS дней
+# переносятся командой archive_requests; фото и видео — в zip-архивы в REQUEST_ARCHIVE_ROOT (вне MEDIA_ROOT)
+REQUEST_ARCHIVE_AFTER_DAYS = int(os.environ.get('REQUEST_ARCHIVE_AFTER_DAYS', 365))
+REQUEST_ARCHIVE_BATCH_SIZE = int(os.environ.get('REQUEST_ARCHIVE_BATCH_SIZE', 100))
+REQUEST_ARCHIVE_ROOT = os.environ.get('REQUEST_ARCHIVE_ROOT', str(BASE_DIR / 'archive'))
 
 
 # Password validation
@@ -126,6 +222,16 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Оригиналы фото заявок больше этого размера (по длинной стороне, px) перекодируются в JPEG.
+# Пусто — оригиналы хранятся как есть
+REPAIR_PHOTO_MAX_SIDE = int(os.environ['REPAIR_PHOTO_MAX_SIDE']) if os.environ.get('REPAIR_PHOTO_MAX_SIDE') else None
+
+# Поблочная загрузка видео заявок
+VIDEO_UPLOAD_MAX_SIZE = int(os.environ.get('VIDEO_UPLOAD_MAX_SIZE', 500 * 1024 * 1024))
+VIDEO_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+# Недокачанные файлы лежат рядом с MEDIA_ROOT, чтобы готовый файл переносился переименованием
+VIDEO_UPLOAD_TEMP_DIR = MEDIA_ROOT / 'uploads' / 'partial'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -137,7 +243,6 @@ LOGIN_URL = '/login/'             # куда редиректить при @logi
 LOGIN_REDIRECT_URL = '/home/'     # куда редиректить после логина
 
 # Production settings for PythonAnywhere
-import os
 if os.environ.get('PYTHONANYWHERE_DOMAIN'):
     ALLOWED_HOSTS = ['ashishelskiy.pythonanywhere.com']
     DEBUG = False
\ No newline at end of file
@@ -0,0 +1,154 @@
+# service_track_app/act_rules.py
+"""
+Правила формулировок акта.
+
+Текст акта определяется тройкой (решение, заключение, причина отказа). Правила ниже проверяются
+сверху вниз, ANY совпадает с любым значением. При загрузке модуля правила раскрываются в таблицу
+по всем комбинациям choices, поэтому выбор текста для заявки — один поиск в словаре.
+"""
+from itertools import product
+
+from django.core import checks
+
+from .models import RepairRequest
+
+ANY = '*'
+
+NOT_FACTORY_DEFECT = (
+    "В результате лабораторного исследования выявлено: {detected_problem}. Что не является заводским браком.\n"
+    "\n"
+    "Проведенный анализ показывает, что эксплуатация изделия проходила с нарушениями требований, "
+    "оговоренных в «Руководстве по эксплуатации». В связи с этим сообщаем, что на данное изделие условия "
+    "гарантийного ремонта, обмена или компенсации не распространяются."
+)
+
+ACT_TEXTS = {
+    'paid_repair': NOT_FACTORY_DEFECT + (
+        "\n"
+        "\n"
+        "Стоимость негарантийного ремонта:\n"
+        "1. Стоимость комплектующих - {parts_cost:.2f} руб.\n"
+        "2. {repair_type_text} - {labor_cost:.2f} руб.\n"
+        "Итого: {total_cost:.2f} руб."
+    ),
+    'no_spare_parts': NOT_FACTORY_DEFECT + " Платный ремонт невозможен в связи с отсутствием запасных частей.",
+    'client_refused': NOT_FACTORY_DEFECT + " Клиент отказался от платного ремонта.",
+    'no_issue': (
+        "В результате лабораторного исследования дефектов не обнаружено. "
+        "Товар полностью исправен и отвечает заявленным характеристикам."
+    ),
+    'warranty_repair': (
+        "В результате лабораторного исследования выявлено: {detected_problem}.\n"
+        "Все неисправности устранены согласно гарантийным обязательствам."
+    ),
+    'exchange_factory_defect': (
+        "В результате лабораторного исследования выявлено: {detected_problem}. Что является заводским браком.\n"
+        "Товар будет заменен на новый."
+    ),
+    'exchange': (
+        "В результате лабораторного исследования выявлено: {detected_problem}.\n"
+        "Товар будет заменен на новый."
+    ),
+    # Старый формат для совместимости: решение не выбрано
+    'fallback': (
+        "В результате лабораторного исследования выявлено: {detected_or_unknown}\n"
+        "и принято следующее заключение: {conclusion_text} {decision_text}."
+    ),
+}
+
+# (решение, заключение, причина отказа) -> ключ ACT_TEXTS; первое совпавшее правило побеждает
+ACT_RULES = [
+    ('paid_repair', ANY, ANY, 'paid_repair'),
+    ('hydra_repair', ANY, ANY, 'paid_repair'),
+    ('demo_repair', ANY, ANY, 'paid_repair'),
+
+    ('return', ANY, 'no_spare_parts', 'no_spare_parts'),
+    ('return', ANY, 'client_refused', 'client_refused'),
+    ('return', ANY, ANY, 'no_issue'),
+
+    ('warranty_repair', ANY, ANY, 'warranty_repair'),
+
+    ('exchange', 'factory_defect', ANY, 'exchange_factory_defect'),
+    ('exchange', ANY, ANY, 'exchange'),
+
+    ('', ANY, ANY, 'fallback'),
+]
+
+DECISIONS = [value for value, _ in RepairRequest.DECISION_CHOICES]
+CONCLUSIONS = [value for value, _ in RepairRequest.CONCLUSION_CHOICES]
+REFUSAL_REASONS = [value for value, _ in RepairRequest.REFUSAL_REASON_CHOICES]
+
+
+def _matches(pattern, value):
+    return pattern == ANY or pattern == value
+
+
+def compile_act_rules(rules=ACT_RULES):
+    """Раскрывает правила в таблицу {(решение, заключение, причина отказа): ключ текста} по всем choices."""
+    table = {}
+    for key in product(DECISIONS, CONCLUSIONS, REFUSAL_REASONS):
+        for *pattern, text_key in rules:
+            if all(_matches(p, v) for p, v in zip(pattern, key)):
+                table[key] = text_key
+                break
+    return table
+
+
+def validate_act_rules(rules=ACT_RULES):
+    """Список ошибок в правилах: значения вне choices, неизвестные тексты и непокрытые комбинации."""
+    errors = []
+    for decision, conclusion, refusal_reason, text_key in rules:
+        for value, allowed, field in ((decision, DECISIONS, 'decision'),
+                                      (conclusion, CONCLUSIONS, 'conclusion'),
+                                      (refusal_reason, REFUSAL_REASONS, 'refusal_reason')):
+            if value != ANY and value not in allowed:
+                errors.append(f"Правило {decision, conclusion, refusal_reason}: {field}={value!r} нет в choices")
+        if text_key not in ACT_TEXTS:
+            errors.append(f"Правило {decision, conclusion, refusal_reason}: неизвестный текст {text_key!r}")
+
+    table = compile_act_rules(rules)
+    for key in product(DECISIONS, CONCLUSIONS, REFUSAL_REASONS):
+        if key not in table:
+            errors.append(f"Комбинация {key} не покрыта правилами")
+    return errors
+
+
+ACT_TEXT_TABLE = compile_act_rules()
+
+
+def act_text_params(repair_request):
+    """Значения для подстановки в тексты актов."""
+    repair_type_text = "Работы"
+    if repair_request.repair_type == 'acoustics' and repair_request.acoustics_repair_subtype:
+        repair_type_text = repair_request.acoustics_repair_subtype
+    elif repair_request.repair_type == 'amplifier' and repair_request.amplifier_repair_subtype:
+        repair_type_text = repair_request.amplifier_repair_subtype
+    elif repair_request.repair_type and repair_request.get_repair_type_display():
+        repair_type_text = repair_request.get_repair_type_display()
+
+    return {
+        'detected_problem': repair_request.detected_problem or "",
+        'detected_or_unknown': repair_request.detected_problem or "не указано",
+        'parts_cost': repair_request.parts_cost or 0,
+        'labor_cost': repair_request.labor_cost or 0,
+        'total_cost': repair_request.total_cost or 0,
+        'repair_type_text': repair_type_text,
+        'conclusion_text': repair_request.get_conclusion_display() if repair_request.conclusion else "не указано",
+        'decision_text': repair_request.get_decision_display() if repair_request.decision else "не указано",
+    }
+
+
+def act_text_key(decision, conclusion, refusal_reason):
+    # Значения вне choices (старые данные) — как при невыбранном решении
+    return ACT_TEXT_TABLE.get((decision or '', conclusion or '', refusal_reason or ''), 'fallback')
+
+
+def generate_act_text(repair_request):
+    """Текст акта для заявки по таблице правил."""
+    text_key = act_text_key(repair_request.decision, repair_request.conclusion, repair_request.refusal_reason)
+    return ACT_TEXTS[text_key].format(**act_text_params(repair_request))
+
+
+@checks.register()
+def check_act_rules(app_configs, **kwargs):
+    return [checks.Error(message, id='service_track_app.E001') for message in validate_act_rules()]
@@ -0,0 +1,289 @@
+# service_track_app/acts.py
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+from docxtpl import DocxTemplate
+from jinja2 import Environment
+
+ACT_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'word', 'act_template.docx')
+ACT_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+RENDERED_ACT_KEY = 'act:docx:%s:%s'
+
+
+def build_act_context(repair_request):
+    """Данные для шаблона акта (без рендеринга) — по ним же считается версия готового акта."""
+    # Импорт здесь: процессы пула рендеринга импортируют этот модуль без настроенного реестра моделей
+    from .act_rules import generate_act_text
+    from .catalog import get_product
+
+    now = timezone.now()
+    return {
+        'act_number': f"{repair_request.id}/{now.strftime('%m/%y')}",
+        'act_date': now.strftime('%d.%m.%Y'),
+        'product_name': get_product(repair_request.product_id).label,
+        'serial_number': repair_request.serial_number,
+        'received_date': repair_request.created_at.strftime('%d.%m.%Y'),
+        'customer_name': repair_request.customer_name or "Неизвестный клиент",
+        'problem_description': repair_request.problem_description or "не указано",
+
+        # ВАЖНО: передаем сгенерированный текст
+        'act_text': generate_act_text(repair_request),
+
+        # Оставляем старые поля для совместимости
+        'conclusion': repair_request.get_conclusion_display() if repair_request.conclusion else "не указано",
+        'decision': repair_request.get_decision_display() if repair_request.decision else "не указано",
+        'detected_problem': repair_request.detected_problem or "не указано",
+        'refusal_reason': repair_request.get_refusal_reason_display() if repair_request.refusal_reason else "не указано",
+    }
+
+
+class _PreparsedDocxTemplate(DocxTemplate):
+    """DocxTemplate, которому XML тела документа передаётся уже подготовленным для jinja2."""
+
+    def __init__(self, template_file, patched_body_xml):
+        super().__init__(template_file)
+        self._patched_body_xml = patched_body_xml
+
+    def build_xml(self, context, jinja_env=None):
+        return self.render_xml_part(self._patched_body_xml, self.docx._part, context, jinja_env)
+
+
+class _CompiledTemplatesEnvironment(Environment):
+    """Окружение jinja2, которое компилирует XML частей документа один раз, а не при каждом рендеринге."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._compiled = {}
+
+    def from_string(self, source, globals=None, template_class=None):
+        if globals or template_class:
+            return super().from_string(source, globals, template_class)
+        template = self._compiled.get(source)
+        if template is None:
+            template = self._compiled[source] = super().from_string(source)
+        return template
+
+
+class ActTemplate:
+    """
+    Разобранный шаблон акта: байты файла, подготовленный XML тела и скомпилированные jinja-шаблоны.
+    Сам DocxTemplate при рендеринге меняет документ, поэтому на каждый акт создаётся свой,
+    но из памяти и без повторной подготовки XML.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        with open(path, 'rb') as f:
+            self.source = f.read()
+
+        doc = DocxTemplate(BytesIO(self.source))
+        doc.init_docx()
+        self.patched_body_xml = doc.patch_xml(doc.get_xml())
+        self.jinja_env = _CompiledTemplatesEnvironment()
+
+    def render(self, context):
+        doc = _PreparsedDocxTemplate(BytesIO(self.source), self.patched_body_xml)
+        doc.render(context, jinja_env=self.jinja_env)
+        byte_io = BytesIO()
+        doc.save(byte_io)
+        return byte_io.getvalue()
+
+
+_act_template = None
+_act_template_lock = threading.Lock()
+
+
+def get_act_template():
+    """Шаблон акта, разобранный один раз на процесс; перечитывается, если файл на диске изменился."""
+    global _act_template
+    mtime = os.path.getmtime(ACT_TEMPLATE_PATH)
+    template = _act_template
+    if template is None or template.mtime != mtime:
+        with _act_template_lock:
+            template = _act_template
+            if template is None or template.mtime != mtime:
+                template = _act_template = ActTemplate(ACT_TEMPLATE_PATH)
+    return template
+
+
+def _act_version(template, context):
+    payload = json.dumps(context, sort_keys=True, ensure_ascii=False) + str(template.mtime)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def render_act_docx(repair_request):
+    """
+    Готовый акт в виде байтов DOCX.
+    Результат кэшируется по id заявки и версии содержимого (данные акта + версия шаблона),
+    поэтому повторные скачивания отдаются без рендеринга, а любое изменение полей заявки,
+    смена даты или шаблона дают новый ключ. Если шаблона нет — FileNotFoundError.
+    """
+    template = get_act_template()
+    context = build_act_context(repair_request)
+    key = RENDERED_ACT_KEY % (repair_request.id, _act_version(template, context))
+
+    content = cache.get(key)
+    if content is None:
+        content = template.render(context)
+        cache.set(key, content, timeout=settings.ACT_CACHE_TIMEOUT)
+    return content
+
+
+def act_filename(repair_request):
+    return f"Акт_№{repair_request.id}.docx"
+
+
+def _init_act_worker():
+    # Процесс пула запускается заново (spawn), а не копией воркера: настраиваем Django сами
+    import django
+    django.setup()
+
+
+def _render_in_worker(context):
+    # Выполняется в процессе пула: шаблон разбирается один раз на процесс, к БД не обращается
+    return get_act_template().render(context)
+
+
+_act_pool = None
+_act_pool_lock = threading.Lock()
+
+
+def _get_act_pool():
+    """
+    Пул процессов для пакетного рендеринга, общий для всех запросов воркера.
+    Процессы стартуют через spawn: fork из многопоточного воркера копирует чужие блокировки
+    и открытые соединения с БД.
+    """
+    global _act_pool
+    with _act_pool_lock:
+        if _act_pool is None:
+            # Соединения вне транзакции закрываем: процессы пула не должны получить их сокеты
+            for connection in connections.all(initialized_only=True):
+                if not connection.in_atomic_block:
+                    connection.close()
+            _act_pool = ProcessPoolExecutor(
+                max_workers=settings.ACT_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_act_worker,
+            )
+        return _act_pool
+
+
+def _reset_act_pool():
+    global _act_pool
+    with _act_pool_lock:
+        if _act_pool is not None:
+            _act_pool.shutdown(wait=False, cancel_futures=True)
+            _act_pool = None
+
+
+def render_acts(repair_requests):
+    """
+    Рендерит акты для набора заявок. Уже готовые берутся из кэша, остальные рендерятся в пуле процессов.
+    Генератор: по мере готовности отдаёт (заявка, байты DOCX или None, текст ошибки или '').
+    Ошибка одного акта не прерывает остальные.
+    """
+    template = get_act_template()
+    pending = {}
+
+    for repair_request in repair_requests:
+        if not (repair_request.conclusion and repair_request.decision):
+            yield repair_request, None, "Не заполнены заключение и принятое решение"
+            continue
+        try:
+            context = build_act_context(repair_request)
+        except Exception as e:
+            yield repair_request, None, str(e)
+            continue
+        key = RENDERED_ACT_KEY % (repair_request.id, _act_version(template, context))
+        content = cache.get(key)
+        if content is not None:
+            yield repair_request, content, ''
+        else:
+            pending[key] = (repair_request, context)
+
+    if not pending:
+        return
+
+    try:
+        pool = _get_act_pool()
+        futures = {pool.submit(_render_in_worker, context): key for key, (_, context) in pending.items()}
+    except (BrokenProcessPool, RuntimeError):
+        _reset_act_pool()
+        for repair_request, _ in pending.values():
+            yield repair_request, None, "Пул рендеринга недоступен, повторите попытку"
+        return
+
+    for future in as_completed(futures):
+        key = futures[future]
+        repair_request = pending[key][0]
+        try:
+            content = future.result()
+        except BrokenProcessPool:
+            _reset_act_pool()
+            yield repair_request, None, "Процесс рендеринга завершился аварийно"
+            continue
+        except Exception as e:
+            yield repair_request, None, str(e) or e.__class__.__name__
+            continue
+        cache.set(key, content, timeout=settings.ACT_CACHE_TIMEOUT)
+        yield repair_request, content, ''
+
+
+class ZipStream:
+    """Приёмник для zipfile без seek: записанное забирается кусками по мере формирования архива."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_package_acts_zip(repair_requests):
+    """
+    Генератор байтов ZIP-архива с актами заявок: каждый документ дописывается в архив,
+    как только готов, а в конце — manifest.csv со статусом по каждой заявке.
+    """
+    stream = ZipStream()
+    manifest = []
+
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for repair_request, content, error in render_acts(repair_requests):
+            if content is not None:
+                archive.writestr(act_filename(repair_request), content)
+                manifest.append((repair_request.id, repair_request.serial_number, act_filename(repair_request), 'ok', ''))
+            else:
+                manifest.append((repair_request.id, repair_request.serial_number, '', 'error', error))
+            yield stream.pop()
+
+        rows = StringIO()
+        writer = csv.writer(rows, delimiter=';')
+        writer.writerow(['request_id', 'serial_number', 'file', 'status', 'error'])
+        writer.writerows(sorted(manifest))
+        # BOM — чтобы Excel открыл файл в UTF-8
+        archive.writestr('manifest.csv', '\ufeff' + rows.getvalue())
+
+    yield stream.pop()
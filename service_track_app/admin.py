@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, RepairRequest, DealerCompany, RequestHistory, RepairRequestPhoto, RepairRequestVideo, Product
+from .models import (CustomUser, RepairRequest, DealerCompany, RequestHistory, RepairRequestPhoto, RepairRequestVideo, Product,
+                     ArchivedRepairRequest)
 
 
 # admin.site.register(CustomUser, UserAdmin)
@@ -25,5 +26,6 @@ admin.site.register(RequestHistory)
 admin.site.register(RepairRequestPhoto)
 admin.site.register(RepairRequestVideo)
 admin.site.register(Product)
+admin.site.register(ArchivedRepairRequest)
 
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ServiceTrackAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'service_track_app'
+
+    def ready(self):
+        from . import act_rules, checks, signals  # noqa: F401
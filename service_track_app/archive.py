@@ -0,0 +1,220 @@
+# service_track_app/archive.py
+"""
+Архив заявок: закрытые и отклонённые заявки, которые не менялись дольше заданного срока, переносятся
+из рабочих таблиц в ArchivedRepairRequest / ArchivedRequestHistory / ArchivedMediaFile.
+
+Перенос идёт пачками. Сначала фото и видео пачки упаковываются в zip-архивы (по архиву на заявку,
+вне транзакции), затем короткая транзакция копирует строки в архив и удаляет заявки из рабочей таблицы.
+Удаление идёт через ORM, поэтому сигналы снимают ссылки MediaBlob (файл удаляется с диска, когда
+на него больше никто не ссылается), убирают заявку из поискового индекса и сбрасывают кэш отслеживания.
+Файлы, загруженные до dedupe_media, в MediaBlob не учтены — их после коммита удаляет delete_untracked_media.
+"""
+import os
+import posixpath
+import shutil
+import zipfile
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import (MEDIA_FILE_FIELDS, ArchivedMediaFile, ArchivedRepairRequest, ArchivedRequestHistory, MediaBlob,
+                     RepairRequest, RequestHistory)
+from .storage import media_storage
+
+ARCHIVABLE_STATUSES = ('closed', 'rejected')
+HISTORY_FIELDS = [
+    'id', 'repair_request_id', 'changed_by_id', 'old_status', 'new_status', 'event_type', 'comment', 'changes',
+    'changed_at',
+]
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class ArchiveResult:
+    archived: int = 0
+    media_files: int = 0
+    # Заявка изменилась, пока упаковывались файлы, — переносится при следующем запуске
+    skipped: int = 0
+    missing_files: list = field(default_factory=list)  # [(id заявки, имя файла)] — нет на диске
+
+
+def archive_cutoff(days=None):
+    if days is None:
+        days = settings.REQUEST_ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_requests(cutoff):
+    """Завершённые заявки, созданные раньше cutoff и без записей истории после него."""
+    recent_history = RequestHistory.objects.filter(repair_request=OuterRef('pk'), changed_at__gte=cutoff)
+    return RepairRequest.objects.filter(status__in=ARCHIVABLE_STATUSES, created_at__lt=cutoff).filter(
+        ~Exists(recent_history)
+    )
+
+
+def media_archive_path(relative_path):
+    return os.path.join(settings.REQUEST_ARCHIVE_ROOT, relative_path)
+
+
+def _media_files(repair_request):
+    # Только оригиналы: миниатюры и превью — производные, в архиве не нужны
+    files = [('photo', photo.photo) for photo in repair_request.photos.all()]
+    files += [('video', video.video) for video in repair_request.videos.all()]
+    return [(kind, field_file) for kind, field_file in files if field_file]
+
+
+def _stored_names(repair_request):
+    # Все файлы заявки в хранилище, включая миниатюры и превью
+    names = set()
+    for media in [*repair_request.photos.all(), *repair_request.videos.all()]:
+        names.update(getattr(media, field_name).name for field_name in MEDIA_FILE_FIELDS[type(media)])
+    return names - {'', None}
+
+
+def delete_untracked_media(names):
+    """
+    Удаляет файлы без строки MediaBlob (загружены до dedupe_media), на которые больше не ссылаются
+    фото и видео. MediaBlob.release такие файлы пропускает. Вызывается после коммита удаления заявок.
+    """
+    names = set(names)
+    if not names:
+        return
+    names -= set(MediaBlob.objects.filter(name__in=names).values_list('name', flat=True))
+    for model, field_names in MEDIA_FILE_FIELDS.items():
+        for field_name in field_names:
+            names -= set(model.objects.filter(**{f'{field_name}__in': names}).values_list(field_name, flat=True))
+    for name in names:
+        media_storage.delete(name)
+
+
+def _media_key(repair_request):
+    return [(kind, field_file.name) for kind, field_file in _media_files(repair_request)]
+
+
+def write_media_archive(repair_request, result):
+    """
+    Упаковывает фото и видео заявки в zip: запись во временный файл и переименование.
+    Возвращает (путь относительно REQUEST_ARCHIVE_ROOT, [ArchivedMediaFile]); без файлов — ('', []).
+    """
+    files = _media_files(repair_request)
+    if not files:
+        return '', []
+
+    relative_path = posixpath.join(
+        timezone.localtime(repair_request.created_at).strftime('%Y/%m'), f"{repair_request.id}.zip"
+    )
+    path = media_archive_path(relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    media = []
+    with zipfile.ZipFile(path + '.part', 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for number, (kind, field_file) in enumerate(files, start=1):
+            try:
+                source = field_file.storage.open(field_file.name, 'rb')
+            except FileNotFoundError:
+                result.missing_files.append((repair_request.id, field_file.name))
+                continue
+            member = f"{kind}-{number}{os.path.splitext(field_file.name)[1].lower()}"
+            with source, archive.open(member, 'w', force_zip64=True) as target:
+                shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+            media.append(ArchivedMediaFile(
+                repair_request_id=repair_request.id,
+                kind=kind,
+                member=member,
+                original_name=field_file.name,
+                size=archive.getinfo(member).file_size,
+            ))
+
+    if not media:
+        os.remove(path + '.part')
+        return '', []
+    os.replace(path + '.part', path)
+    return relative_path, media
+
+
+def _remove_media_archives(relative_paths):
+    for relative_path in relative_paths:
+        if relative_path:
+            try:
+                os.remove(media_archive_path(relative_path))
+            except FileNotFoundError:
+                pass
+
+
+def archive_batch(request_ids, cutoff, result):
+    """Переносит в архив заявки из request_ids, которые всё ещё подходят под archivable_requests(cutoff)."""
+    packed = {}
+    for repair_request in archivable_requests(cutoff).filter(id__in=request_ids).prefetch_related('photos', 'videos'):
+        packed[repair_request.id] = (_media_key(repair_request), *write_media_archive(repair_request, result))
+
+    archived, media = [], []
+    stored_names = set()
+    try:
+        with transaction.atomic():
+            locked = archivable_requests(cutoff).filter(id__in=packed).select_for_update().prefetch_related(
+                'photos', 'videos'
+            )
+            for repair_request in locked:
+                media_key, media_archive, request_media = packed.pop(repair_request.id)
+                # Пока упаковывались файлы, у заявки могли смениться фото или видео
+                if _media_key(repair_request) != media_key:
+                    packed[repair_request.id] = (media_key, media_archive, request_media)
+                    continue
+                archived_request = ArchivedRepairRequest.from_repair_request(repair_request)
+                archived_request.media_archive = media_archive
+                archived.append(archived_request)
+                media += request_media
+                stored_names |= _stored_names(repair_request)
+
+            archived_ids = [archived_request.id for archived_request in archived]
+            ArchivedRepairRequest.objects.bulk_create(archived)
+            ArchivedRequestHistory.objects.bulk_create([
+                ArchivedRequestHistory(**values)
+                for values in RequestHistory.objects.filter(repair_request_id__in=archived_ids).values(*HISTORY_FIELDS)
+            ])
+            ArchivedMediaFile.objects.bulk_create(media)
+            RepairRequest.objects.filter(id__in=archived_ids).delete()
+            transaction.on_commit(lambda: delete_untracked_media(stored_names))
+    except BaseException:
+        _remove_media_archives(media_archive for _, media_archive, _ in packed.values())
+        _remove_media_archives(archived_request.media_archive for archived_request in archived)
+        raise
+
+    # Не перенесённые заявки остаются в рабочей таблице — их архивы файлов не нужны
+    _remove_media_archives(media_archive for _, media_archive, _ in packed.values())
+    result.archived += len(archived)
+    result.media_files += len(media)
+    result.skipped += len(packed)
+
+
+def archive_requests(cutoff=None, batch_size=None, limit=None):
+    """
+    Переносит в архив подходящие заявки пачками по batch_size (не больше limit заявок).
+    Пачки идут по возрастанию id, каждая — в своей транзакции.
+    """
+    cutoff = cutoff or archive_cutoff()
+    batch_size = batch_size or settings.REQUEST_ARCHIVE_BATCH_SIZE
+    result = ArchiveResult()
+    last_id = 0
+    while limit is None or result.archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - result.archived)
+        request_ids = list(
+            archivable_requests(cutoff).filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:size]
+        )
+        if not request_ids:
+            break
+        last_id = request_ids[-1]
+        archive_batch(request_ids, cutoff, result)
+    return result
+
+
+def iter_archived_media(media_file, chunk_size=COPY_CHUNK_SIZE):
+    """Содержимое файла архивной заявки блоками, с распаковкой из её zip-архива на лету."""
+    with zipfile.ZipFile(media_archive_path(media_file.repair_request.media_archive)) as archive:
+        with archive.open(media_file.member) as source:
+            while chunk := source.read(chunk_size):
+                yield chunk
@@ -0,0 +1,113 @@
+# service_track_app/catalog.py
+import copy
+import re
+import threading
+import time
+
+from django.core.cache import cache
+
+from .models import Product, ProductSearchToken
+
+TOKEN_RE = re.compile(r'\w+')
+TOKEN_MAX_LENGTH = 100
+# Больше слов в запросе не учитываем — каждое слово это отдельный подзапрос
+MAX_QUERY_TOKENS = 5
+
+
+def split_tokens(text):
+    return [token[:TOKEN_MAX_LENGTH] for token in TOKEN_RE.findall((text or '').lower())]
+
+
+def product_search_tokens(product):
+    return set(split_tokens(' '.join(filter(None, [product.brand, product.series, product.name]))))
+
+
+def index_products(products):
+    """Пересобирает слова для поиска у переданных товаров."""
+    products = list(products)
+    ProductSearchToken.objects.filter(product__in=products).delete()
+    ProductSearchToken.objects.bulk_create(
+        [ProductSearchToken(product=product, token=token)
+         for product in products for token in product_search_tokens(product)],
+        batch_size=1000,
+    )
+
+
+def search_products(query):
+    """
+    Активные товары, у которых каждое слово запроса — начало какого-либо слова бренда, серии или названия.
+    Префикс ищется диапазоном token >= слово AND token < слово + U+FFFF, поэтому работает по индексу на любой БД.
+    """
+    products = Product.objects.filter(is_active=True)
+    for token in split_tokens(query)[:MAX_QUERY_TOKENS]:
+        products = products.filter(id__in=ProductSearchToken.objects.filter(
+            token__gte=token, token__lt=token + '\uffff'
+        ).values('product_id'))
+    return products.order_by('brand', 'name', 'id')
+
+
+# ---------- Кэш каталога в памяти процесса ----------
+
+CATALOG_VERSION_KEY = 'catalog:products:version'
+
+_catalog = {}
+_catalog_version = None
+_catalog_lock = threading.Lock()
+
+
+def invalidate_product_catalog():
+    """
+    Сбрасывает кэш каталога во всех процессах: новая версия в общем кэше Django,
+    каждый процесс сверяет её при обращении и очищает свою копию.
+    """
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+    with _catalog_lock:
+        _catalog.clear()
+
+
+def _current_catalog():
+    global _catalog_version
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    if version != _catalog_version:
+        with _catalog_lock:
+            if version != _catalog_version:
+                _catalog.clear()
+                _catalog_version = version
+    return _catalog
+
+
+def get_products(product_ids):
+    """
+    Товары по id из кэша каталога: {id: Product}. Недостающие догружаются одним запросом.
+    У товаров заранее посчитаны str() и display_name() — product.label и product.display.
+    Экземпляры общие для всех запросов процесса — только для чтения.
+    """
+    catalog = _current_catalog()
+    missing = {product_id for product_id in product_ids if product_id is not None and product_id not in catalog}
+    if missing:
+        for product in Product.objects.filter(id__in=missing):
+            product.label = str(product)
+            product.display = product.display_name()
+            catalog[product.id] = product
+    return {product_id: catalog[product_id] for product_id in product_ids if product_id in catalog}
+
+
+def get_product(product_id):
+    return get_products([product_id]).get(product_id)
+
+
+def attach_products(objects):
+    """
+    Подставляет товары из кэша каталога в obj.product (вместо JOIN/prefetch по товарам).
+    Каждому объекту — своя копия, чтобы случайные изменения не попадали в общий кэш.
+    """
+    objects = list(objects)
+    products = get_products({obj.product_id for obj in objects})
+    for obj in objects:
+        product = products.get(obj.product_id)
+        if product is not None:
+            obj.product = copy.copy(product)
+    return objects
@@ -0,0 +1,62 @@
+# service_track_app/checks.py
+"""
+Проверки профиля БД (settings.DATABASES). Тег database: выполняются в migrate
+и по команде python manage.py check --database default.
+
+Миграции и поиск ведут себя на SQLite и PostgreSQL одинаково, если у SQLite есть FTS5
+(иначе миграция 0026 не создаст индекс поиска), а после миграций есть таблица индекса.
+"""
+from django.core import checks
+from django.db import connections
+
+from .models import RepairRequest
+from .search import SEARCH_TABLE
+
+
+@checks.register(checks.Tags.database)
+def check_database_profile(app_configs, databases=None, **kwargs):
+    errors = []
+    for alias in databases or []:
+        connection = connections[alias]
+        if connection.vendor == 'sqlite':
+            errors += _check_sqlite(alias, connection)
+        errors += _check_search_index(alias, connection)
+    return errors
+
+
+def _check_sqlite(alias, connection):
+    errors = []
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode")
+        journal_mode = cursor.fetchone()[0]
+        cursor.execute("PRAGMA compile_options")
+        compile_options = {row[0] for row in cursor.fetchall()}
+
+    # Базы в памяти (тесты) в WAL не переводятся
+    if journal_mode not in ('wal', 'memory'):
+        errors.append(checks.Warning(
+            f"SQLite database '{alias}' uses journal_mode={journal_mode} instead of WAL",
+            hint="Add 'PRAGMA journal_mode=WAL' to OPTIONS['init_command']; WAL does not work on network file systems.",
+            id='service_track_app.W001',
+        ))
+    if 'ENABLE_FTS5' not in compile_options:
+        errors.append(checks.Error(
+            f"SQLite of database '{alias}' is built without FTS5",
+            hint="Migration 0026 creates the full-text search index as an FTS5 table.",
+            id='service_track_app.E002',
+        ))
+    return errors
+
+
+def _check_search_index(alias, connection):
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return []
+    table_names = connection.introspection.table_names()
+    # До миграций проверять нечего
+    if RepairRequest._meta.db_table not in table_names or SEARCH_TABLE in table_names:
+        return []
+    return [checks.Warning(
+        f"Database '{alias}' has no full-text search table {SEARCH_TABLE}",
+        hint="Run migrate, then manage.py rebuild_search_index.",
+        id='service_track_app.W002',
+    )]
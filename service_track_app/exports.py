@@ -0,0 +1,238 @@
+# service_track_app/exports.py
+"""
+Потоковая выгрузка заявок в CSV и XLSX.
+
+Строки читаются из БД порциями (values_list().iterator()) и сразу отдаются клиенту,
+поэтому память не растёт с размером выгрузки, а ответ начинается до окончания выборки.
+"""
+import csv
+import re
+import zipfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.utils import timezone
+
+from .acts import ZipStream
+from .catalog import get_products
+from .models import RepairRequest
+
+# (поле для values_list, заголовок колонки)
+EXPORT_COLUMNS = [
+    ('id', "№ заявки"),
+    ('created_at', "Создана"),
+    ('dealer_company__name', "Компания дилера"),
+    ('serial_number', "Серийный номер"),
+    ('product_id', "Товар"),
+    ('warranty_status', "Статус гарантии"),
+    ('status', "Статус заявки"),
+    ('conclusion', "Заключение"),
+    ('decision', "Принятое решение"),
+    ('act_status', "Статус акта"),
+    ('completion_date', "Дата завершения"),
+    ('labor_cost', "Стоимость работ"),
+    ('parts_cost', "Запчасти"),
+    ('total_cost', "Общая стоимость"),
+    ('paid_by_client', "Оплачено клиентом"),
+    ('payment_date', "Дата оплаты"),
+]
+
+# Поля с choices выгружаются названиями, а не кодами
+EXPORT_CHOICES = {
+    name: {value: label for value, label in RepairRequest._meta.get_field(name).choices if value}
+    for name in ('warranty_status', 'status', 'conclusion', 'decision', 'act_status')
+}
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def export_queryset(filters):
+    """Заявки по фильтрам RequestExportForm.cleaned_data в порядке создания."""
+    repair_requests = RepairRequest.objects.all()
+    # Границы периода — в текущем часовом поясе, чтобы фильтр шёл по индексу created_at без __date
+    if filters.get('date_from'):
+        repair_requests = repair_requests.filter(
+            created_at__gte=timezone.make_aware(datetime.combine(filters['date_from'], time.min))
+        )
+    if filters.get('date_to'):
+        repair_requests = repair_requests.filter(
+            created_at__lt=timezone.make_aware(datetime.combine(filters['date_to'] + timedelta(days=1), time.min))
+        )
+    if filters.get('dealer'):
+        repair_requests = repair_requests.filter(dealer_company=filters['dealer'])
+    for name in ('status', 'decision', 'act_status'):
+        if filters.get(name):
+            repair_requests = repair_requests.filter(**{name: filters[name]})
+    return repair_requests.order_by('created_at', 'id')
+
+
+def iter_export_rows(repair_requests, chunk_size=None):
+    """
+    Строки выгрузки: значения по EXPORT_COLUMNS, choices — названиями, товар — из кэша каталога.
+    Из БД читается не больше chunk_size строк за раз.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    names = [name for name, _ in EXPORT_COLUMNS]
+    product_index, created_index = names.index('product_id'), names.index('created_at')
+    rows = repair_requests.values_list(*names).iterator(chunk_size=chunk_size)
+    choice_indexes = [(i, EXPORT_CHOICES[name]) for i, (name, _) in enumerate(EXPORT_COLUMNS) if name in EXPORT_CHOICES]
+
+    while chunk := list(islice(rows, chunk_size)):
+        products = get_products({row[product_index] for row in chunk})
+        for row in chunk:
+            row = list(row)
+            product = products.get(row[product_index])
+            row[product_index] = product.label if product is not None else ''
+            for i, choices in choice_indexes:
+                row[i] = choices.get(row[i], row[i]) if row[i] else ''
+            if row[created_index] is not None:
+                row[created_index] = timezone.localtime(row[created_index]).replace(tzinfo=None)
+            yield row
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: write() возвращает строку, а не пишет её."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%d.%m.%Y %H:%M')
+    if isinstance(value, date):
+        return value.strftime('%d.%m.%Y')
+    if isinstance(value, Decimal):
+        # Excel с русской локалью ждёт запятую
+        return str(value).replace('.', ',')
+    return value
+
+
+def stream_csv(rows):
+    """Генератор строк CSV (UTF-8 с BOM, разделитель «;» — открывается в Excel без мастера импорта)."""
+    writer = csv.writer(_Echo(), delimiter=';')
+    yield '\ufeff' + writer.writerow([header for _, header in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+# Минимальная книга XLSX: один лист, строки пишутся по мере чтения, строки — inlineStr (без sharedStrings)
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Заявки" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Стили ячеек: 0 — обычная, 1 — дата, 2 — дата и время, 3 — сумма, 4 — заголовок
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="1"><numFmt numFmtId="164" formatCode="dd.mm.yyyy hh:mm"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="5">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '</cellXfs>'
+    '</styleSheet>'
+)
+_XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" '
+    'state="frozen"/></sheetView></sheetViews>'
+    '<sheetData>'
+)
+_XLSX_SHEET_END = '</sheetData></worksheet>'
+
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+# Управляющие символы, недопустимые в XML 1.0
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_cell(value, style=0):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, datetime):
+        delta = value - _EXCEL_EPOCH
+        return f'<c s="2"><v>{delta.days + delta.seconds / 86400:.6f}</v></c>'
+    if isinstance(value, date):
+        return f'<c s="1"><v>{(value - _EXCEL_EPOCH.date()).days}</v></c>'
+    if isinstance(value, Decimal):
+        return f'<c s="3"><v>{value}</v></c>'
+    if isinstance(value, int):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_XML_ILLEGAL.sub('', str(value)))
+    style_attr = f' s="{style}"' if style else ''
+    return f'<c t="inlineStr"{style_attr}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values, style=0):
+    return '<row>' + ''.join(_xlsx_cell(value, style) for value in values) + '</row>'
+
+
+def stream_xlsx(rows, flush_rows=500):
+    """Генератор байтов XLSX: лист дописывается в ZIP построчно и отдаётся кусками по flush_rows строк."""
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _XLSX_WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', _XLSX_WORKBOOK_RELS)
+        archive.writestr('xl/styles.xml', _XLSX_STYLES)
+
+        # force_zip64: размер листа заранее неизвестен, а вернуться и исправить заголовок нельзя
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((_XLSX_SHEET_START + _xlsx_row([header for _, header in EXPORT_COLUMNS], style=4)).encode())
+            for number, row in enumerate(rows, start=1):
+                sheet.write(_xlsx_row(row).encode())
+                if number % flush_rows == 0:
+                    yield stream.pop()
+            sheet.write(_XLSX_SHEET_END.encode())
+
+    yield stream.pop()
@@ -1,8 +1,31 @@
 from django import forms
-from .models import RepairRequest, RepairRequestPhoto, Product
+from django.urls import reverse_lazy
+from .models import RepairRequest, RepairRequestPhoto, Product, DealerCompany
 from django.core.exceptions import ValidationError
 
 
+class ProductAutocompleteSelect(forms.Select):
+    """
+    Выбор товара с подгрузкой вариантов через product_autocomplete (select2 + ajax).
+    В HTML попадает только выбранный товар, а не весь каталог.
+    """
+
+    def __init__(self, attrs=None):
+        attrs = {"class": "form-select select2-product", **(attrs or {})}
+        attrs.setdefault("data-autocomplete-url", reverse_lazy("product_autocomplete"))
+        super().__init__(attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if v and str(v).isdigit()]
+        if hasattr(self.choices, "queryset"):
+            field = self.choices.field
+            products = self.choices.queryset.filter(pk__in=selected) if selected else []
+            self.choices = [("", field.empty_label or "")] + [
+                (obj.pk, field.label_from_instance(obj)) for obj in products
+            ]
+        return super().optgroups(name, value, attrs)
+
+
 class RepairRequestForm(forms.ModelForm):
     class Meta:
         model = RepairRequest
@@ -22,7 +45,7 @@ class RepairRequestForm(forms.ModelForm):
             "problem_description": forms.Textarea(attrs={"class": "form-textarea"}),
             "additional_notes": forms.Textarea(attrs={"class": "form-textarea"}),
             "serial_number": forms.TextInput(attrs={"class": "form-input", "placeholder": "A123456789112345"}),
-            "product": forms.Select(attrs={"class": "form-select select2-product"}),
+            "product": ProductAutocompleteSelect(),
             "customer_name": forms.TextInput(attrs={
                 "class": "form-input customer-field hidden-field",
                 "placeholder": "ФИО покупателя"
@@ -91,7 +114,7 @@ class RepairRequestEditForm(forms.ModelForm):
         widgets = {
             # Основные поля
             "serial_number": forms.TextInput(attrs={"class": "form-input"}),
-            "product": forms.Select(attrs={"class": "form-select select2-product"}),
+            "product": ProductAutocompleteSelect(),
             "purchase_date": forms.DateInput(attrs={"type": "date", "class": "form-input"}),
             "warranty_status": forms.Select(attrs={"class": "form-select"}),
             "problem_description": forms.Textarea(attrs={"class": "form-textarea"}),
@@ -205,4 +228,42 @@ class RepairRequestEditForm(forms.ModelForm):
 
         if 'product' in self.fields:
             self.fields['product'].queryset = Product.objects.filter(is_active=True)
-            self.fields['product'].label_from_instance = lambda obj: obj.display_name()
\ No newline at end of file
+            self.fields['product'].label_from_instance = lambda obj: obj.display_name()
+
+
+class RepairRequestAutosaveForm(RepairRequestEditForm):
+    """Поля автосохранения (services.save_request_changes): форма редактирования и ячейки таблицы пакета."""
+
+    class Meta(RepairRequestEditForm.Meta):
+        fields = RepairRequestEditForm.Meta.fields + ["customer_name"]
+
+
+class RequestExportForm(forms.Form):
+    """Фильтры выгрузки заявок для сервисного центра; пустое поле — без фильтра."""
+    FORMAT_CHOICES = [('csv', 'CSV'), ('xlsx', 'Excel (XLSX)')]
+
+    date_from = forms.DateField(label="Создана с", required=False,
+                                widget=forms.DateInput(attrs={"type": "date", "class": "form-input"}))
+    date_to = forms.DateField(label="по", required=False,
+                              widget=forms.DateInput(attrs={"type": "date", "class": "form-input"}))
+    dealer = forms.ModelChoiceField(label="Компания дилера", required=False, empty_label="Все",
+                                    queryset=DealerCompany.objects.order_by('name'),
+                                    widget=forms.Select(attrs={"class": "form-select"}))
+    status = forms.ChoiceField(label="Статус заявки", required=False,
+                               choices=[('', 'Все')] + RepairRequest.STATUS_CHOICES,
+                               widget=forms.Select(attrs={"class": "form-select"}))
+    decision = forms.ChoiceField(label="Принятое решение", required=False,
+                                 choices=[('', 'Все')] + RepairRequest.DECISION_CHOICES[1:],
+                                 widget=forms.Select(attrs={"class": "form-select"}))
+    act_status = forms.ChoiceField(label="Статус акта", required=False,
+                                   choices=[('', 'Все')] + RepairRequest.ACT_STATUS_CHOICES,
+                                   widget=forms.Select(attrs={"class": "form-select"}))
+    format = forms.ChoiceField(label="Формат", choices=FORMAT_CHOICES, initial='csv',
+                               widget=forms.Select(attrs={"class": "form-select"}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from, date_to = cleaned_data.get('date_from'), cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise ValidationError("Дата начала периода позже даты окончания")
+        return cleaned_data
@@ -0,0 +1,75 @@
+# service_track_app/images.py
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (300, 300)
+PREVIEW_SIZE = (1280, 1280)
+
+# WebP заметно легче JPEG; если Pillow собран без libwebp — откатываемся на JPEG
+DERIVATIVE_FORMAT, DERIVATIVE_EXT = ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def _encode(image, size, image_format, quality):
+    copy = image.copy()
+    copy.thumbnail(size, Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    copy.save(buffer, format=image_format, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _load(field_file):
+    """Открывает изображение с учётом EXIF-ориентации и приводит к RGB."""
+    field_file.open('rb')
+    try:
+        with Image.open(field_file) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.load()
+            return image
+    finally:
+        field_file.seek(0)
+
+
+def encode_photo_derivatives(photo):
+    """
+    Кодирует для RepairRequestPhoto миниатюру и превью (WebP/JPEG, с учётом EXIF-ориентации).
+    Если задан REPAIR_PHOTO_MAX_SIDE, оригинал больше этого размера перекодируется в JPEG.
+    Только работа с изображением, без хранилища и БД — вызывается вне транзакции.
+    Возвращает {поле: (имя файла, байты)} для save_photo_derivatives или None,
+    если файл не удалось прочитать как изображение.
+    """
+    try:
+        image = _load(photo.photo)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.warning("Не удалось построить превью для %s: %s", photo.photo.name, e)
+        return None
+
+    stem = os.path.splitext(os.path.basename(photo.photo.name))[0]
+    derivatives = {}
+
+    max_side = getattr(settings, 'REPAIR_PHOTO_MAX_SIDE', None)
+    if max_side and max(image.size) > max_side:
+        derivatives['photo'] = (f"{stem}.jpg", _encode(image, (max_side, max_side), 'JPEG', 85))
+
+    derivatives['thumbnail'] = (f"{stem}.{DERIVATIVE_EXT}", _encode(image, THUMBNAIL_SIZE, DERIVATIVE_FORMAT, 75))
+    derivatives['preview'] = (f"{stem}.{DERIVATIVE_EXT}", _encode(image, PREVIEW_SIZE, DERIVATIVE_FORMAT, 80))
+    return derivatives
+
+
+def save_photo_derivatives(photo, derivatives):
+    """
+    Записывает в хранилище файлы из encode_photo_derivatives. Модель не сохраняет; вызывается в той же
+    транзакции, что и photo.save(), — запись в хранилище держит блокировку MediaBlob до учёта ссылок.
+    """
+    # Заменённые файлы не удаляем здесь: они могут использоваться другими фото,
+    # ссылки на них снимаются после сохранения модели (MediaBlob.release)
+    for field_name, (name, content) in derivatives.items():
+        getattr(photo, field_name).save(name, ContentFile(content), save=False)
@@ -0,0 +1,103 @@
+# service_track_app/importers.py
+import csv
+import json
+import os
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_array(f, chunk_size=READ_CHUNK_SIZE):
+    """
+    Потоковый разбор JSON-массива верхнего уровня: отдаёт элементы по одному,
+    читая файл блоками, поэтому весь файл в памяти не держится.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+
+    while True:
+        # Пропускаем пробелы и разделители между элементами
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            buffer, position = f.read(chunk_size), 0
+            eof = not buffer
+
+        if position >= len(buffer):
+            raise ValueError("Неожиданный конец JSON: нет закрывающей ]")
+
+        if not started:
+            if buffer[position] != '[':
+                raise ValueError("Ожидался JSON-массив")
+            started = True
+            position += 1
+            continue
+
+        if buffer[position] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Элемент не поместился в буфер — дочитываем и пробуем снова
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+
+        if end == len(buffer) and not eof:
+            # Число на границе блока могло обрезаться — дочитываем, чтобы не разобрать его частично
+            chunk = f.read(chunk_size)
+            if chunk:
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+            eof = True
+
+        yield item
+        position = end
+
+
+def iter_csv_rows(f, sample_size=READ_CHUNK_SIZE):
+    """Строки CSV как dict по заголовку; разделитель (, ; или табуляция) определяется по началу файла."""
+    sample = f.read(sample_size)
+    f.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    for row in csv.DictReader(f, dialect=dialect):
+        # Лишние значения без заголовка (key=None) отбрасываем
+        yield {key.strip(): (value or '').strip() for key, value in row.items() if key is not None}
+
+
+def iter_records(f, path):
+    """Записи выгрузки из CSV или JSON-массива (по расширению файла), по одной."""
+    if os.path.splitext(path)[1].lower() == '.json':
+        return iter_json_array(f)
+    return iter_csv_rows(f)
+
+
+def header_map(model, extra=None):
+    """
+    Соответствие заголовков выгрузки полям модели: имя поля или его verbose_name без учёта регистра.
+    extra — дополнительные синонимы {заголовок: поле}.
+    """
+    mapping = {}
+    for field in model._meta.concrete_fields:
+        mapping[field.name.lower()] = field.name
+        mapping[str(field.verbose_name).lower()] = field.name
+    for header, field_name in (extra or {}).items():
+        mapping[header.lower()] = field_name
+    return mapping
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 'да', 'д', '+')
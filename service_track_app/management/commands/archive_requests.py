@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from service_track_app.archive import archivable_requests, archive_cutoff, archive_requests
+
+
+class Command(BaseCommand):
+    help = 'Move closed and rejected repair requests with no recent changes to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.REQUEST_ARCHIVE_AFTER_DAYS,
+                            help='Archive requests unchanged for more than this many days')
+        parser.add_argument('--batch-size', type=int, default=settings.REQUEST_ARCHIVE_BATCH_SIZE,
+                            help='Requests per transaction')
+        parser.add_argument('--limit', type=int, help='Archive at most this many requests')
+        parser.add_argument('--dry-run', action='store_true', help='Only count requests that would be archived')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError("--days and --batch-size must be positive")
+
+        cutoff = archive_cutoff(options['days'])
+        if options['dry_run']:
+            count = archivable_requests(cutoff).count()
+            self.stdout.write(self.style.SUCCESS(f"Dry run. Requests to archive: {count}"))
+            return
+
+        started = time.monotonic()
+        result = archive_requests(cutoff, batch_size=options['batch_size'], limit=options['limit'])
+
+        for request_id, name in result.missing_files[:20]:
+            self.stdout.write(self.style.WARNING(f"Request #{request_id}: file {name} is missing, not archived"))
+        if len(result.missing_files) > 20:
+            self.stdout.write(self.style.WARNING(f"... and {len(result.missing_files) - 20} more missing files"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived requests: {result.archived}, media files: {result.media_files}, "
+            f"skipped (changed during archiving): {result.skipped} in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from service_track_app.images import encode_photo_derivatives, save_photo_derivatives
+from service_track_app.models import RepairRequestPhoto
+
+
+class Command(BaseCommand):
+    help = 'Build thumbnails and previews for existing repair request photos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild derivatives that already exist')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Photos fetched per database round trip')
+
+    def handle(self, *args, **options):
+        photos = RepairRequestPhoto.objects.order_by('id')
+        if not options['force']:
+            photos = photos.filter(thumbnail='')
+
+        built_count = 0
+        failed_count = 0
+
+        for photo in photos.iterator(chunk_size=options['chunk_size']):
+            derivatives = encode_photo_derivatives(photo)
+            if derivatives:
+                with transaction.atomic():
+                    save_photo_derivatives(photo, derivatives)
+                    photo.save(update_fields=['photo', 'thumbnail', 'preview'])
+                built_count += 1
+            else:
+                failed_count += 1
+                self.stdout.write(self.style.WARNING(f"Skipped photo #{photo.id}: {photo.photo.name}"))
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Derivatives built: {built_count}, skipped: {failed_count}")
+        )
@@ -0,0 +1,28 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from service_track_app.models import VideoUpload
+from service_track_app.uploads import partial_path
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned chunked video uploads that were never attached to a request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=48, help='Age after which an upload is abandoned')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        abandoned = VideoUpload.objects.filter(created_at__lt=cutoff, status__in=['uploading', 'complete'])
+
+        deleted_count = 0
+        for upload in abandoned.iterator():
+            path = partial_path(upload)
+            if os.path.exists(path):
+                os.remove(path)
+            upload.delete()
+            deleted_count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted abandoned uploads: {deleted_count}"))
@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from service_track_app.models import MEDIA_FILE_FIELDS, MediaBlob
+from service_track_app.storage import content_name, file_digest, media_storage
+
+RECOUNT_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Move existing media files to content-addressed names, remove duplicates and rebuild reference counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how much space would be saved')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        renamed = {}
+        field_renames = {}
+        copies = []
+        targets = set()
+        missing = set()
+        duplicate_count = 0
+        saved_bytes = 0
+
+        for model, field_names in MEDIA_FILE_FIELDS.items():
+            for field_name in field_names:
+                directory = model._meta.get_field(field_name).upload_to.rstrip('/')
+                names = model.objects.exclude(**{field_name: ''}).values_list(field_name, flat=True).distinct()
+
+                for name in names.iterator():
+                    if name in missing:
+                        continue
+                    if name in renamed:
+                        field_renames.setdefault((model, field_name), []).append((name, renamed[name]))
+                        continue
+                    if not media_storage.exists(name):
+                        missing.add(name)
+                        self.stdout.write(self.style.WARNING(f"Missing file: {name}"))
+                        continue
+
+                    with media_storage.open(name, 'rb') as content:
+                        target = content_name(directory, file_digest(content), os.path.splitext(name)[1])
+                    renamed[name] = target
+                    if target == name:
+                        targets.add(target)
+                        continue
+                    field_renames.setdefault((model, field_name), []).append((name, target))
+
+                    if target in targets or media_storage.exists(target):
+                        duplicate_count += 1
+                        saved_bytes += media_storage.size(name)
+                    else:
+                        copies.append((name, target))
+                    targets.add(target)
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f"Files checked: {len(renamed)}, duplicates: {duplicate_count}, "
+                f"would free: {saved_bytes / (1024 * 1024):.1f} MB"
+            ))
+            return
+
+        # Файлы под новыми именами появляются до переименования в БД, а старые удаляются только после
+        # коммита: при сбое на любом шаге строки указывают на существующие файлы, повторный запуск доделает
+        for name, target in copies:
+            self._copy(name, target)
+
+        superseded = [name for name, target in renamed.items() if target != name]
+        with transaction.atomic():
+            # Массовые update без сигналов: счётчики ссылок ниже пересчитываются целиком
+            for (model, field_name), renames in field_renames.items():
+                for old_name, new_name in renames:
+                    model.objects.filter(**{field_name: old_name}).update(**{field_name: new_name})
+
+            tracked_count, unreferenced = self._recount_blobs()
+            transaction.on_commit(lambda: self._remove_files(superseded, unreferenced))
+
+        self._remove_empty_dirs()
+        self.stdout.write(self.style.SUCCESS(
+            f"Files checked: {len(renamed)}, duplicates removed: {duplicate_count}, "
+            f"freed: {saved_bytes / (1024 * 1024):.1f} MB, tracked files: {tracked_count}"
+        ))
+
+    def _copy(self, name, target):
+        target_path = media_storage.path(target)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        # Жёсткая ссылка не копирует байты; через временное имя — чтобы не оставить недописанный файл
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(target_path), delete=False) as temp:
+            temp_path = temp.name
+        try:
+            os.remove(temp_path)
+            try:
+                os.link(media_storage.path(name), temp_path)
+            except OSError:
+                shutil.copyfile(media_storage.path(name), temp_path)
+            os.replace(temp_path, target_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _recount_blobs(self):
+        """
+        Пересчитывает MediaBlob по ссылкам из БД. Строки не удаляются, а обновляются под блокировкой
+        (как в MediaBlob.lock): параллельная загрузка либо уже закоммитила строку и acquire() — и она
+        посчитана, либо ждёт блокировку и прибавит свою ссылку после пересчёта.
+        Возвращает (число файлов со ссылками, имена файлов без ссылок).
+        """
+        names = set(MediaBlob.objects.values_list('name', flat=True))
+        for model, field_names in MEDIA_FILE_FIELDS.items():
+            for field_name in field_names:
+                names.update(
+                    model.objects.exclude(**{field_name: ''}).values_list(field_name, flat=True).distinct().iterator()
+                )
+
+        tracked_count = 0
+        unreferenced = []
+        names = sorted(names)
+        for start in range(0, len(names), RECOUNT_BATCH_SIZE):
+            batch = names[start:start + RECOUNT_BATCH_SIZE]
+            MediaBlob.objects.bulk_create([MediaBlob(name=name) for name in batch], ignore_conflicts=True)
+            blobs = list(MediaBlob.objects.select_for_update().filter(name__in=batch).order_by('name'))
+
+            references = Counter()
+            for model, field_names in MEDIA_FILE_FIELDS.items():
+                for field_name in field_names:
+                    rows = model.objects.filter(**{f'{field_name}__in': batch}).values(field_name).annotate(
+                        count=Count('pk')
+                    ).values_list(field_name, 'count')
+                    for name, count in rows:
+                        references[name] += count
+
+            for blob in blobs:
+                blob.ref_count = references[blob.name]
+                if blob.ref_count:
+                    tracked_count += 1
+                else:
+                    unreferenced.append(blob.name)
+            MediaBlob.objects.bulk_update(blobs, ['ref_count'])
+        return tracked_count, unreferenced
+
+    def _remove_files(self, superseded, unreferenced):
+        for name in unreferenced:
+            MediaBlob.delete_unreferenced(name)
+        tracked = set(MediaBlob.objects.filter(name__in=superseded).values_list('name', flat=True))
+        for name in superseded:
+            # Старые имена после коммита не упоминаются в БД; учтённые в MediaBlob удалены выше
+            if name not in tracked:
+                media_storage.delete(name)
+
+    def _remove_empty_dirs(self):
+        for model, field_names in MEDIA_FILE_FIELDS.items():
+            for field_name in field_names:
+                directory = media_storage.path(model._meta.get_field(field_name).upload_to.rstrip('/'))
+                for root, dirs, files in os.walk(directory, topdown=False):
+                    if root != directory and not os.listdir(root):
+                        os.rmdir(root)
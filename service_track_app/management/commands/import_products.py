@@ -1,54 +1,183 @@
+import hashlib
 import json
 import os
-from django.core.management.base import BaseCommand
-from service_track_app.models import Product
+from collections import Counter
+from urllib.parse import urlparse
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from service_track_app.catalog import index_products, invalidate_product_catalog
+from service_track_app.importers import iter_json_array
+from service_track_app.models import Product, RepairRequest
+from service_track_app.search import DOCUMENT_FIELDS, index_repair_requests
+
+IMPORTED_FIELDS = ['brand', 'series', 'category', 'size', 'power_rms', 'power_max', 'external_id', 'external_url']
+
+# Категории источника (код, название или раздел каталога в URL) -> Product.category
+CATEGORY_ALIASES = {
+    **{code: code for code, _ in Product.PRODUCT_CATEGORIES},
+    **{label.lower(): code for code, label in Product.PRODUCT_CATEGORIES},
+    'subwoofers': 'subwoofer', 'сабвуферы': 'subwoofer',
+    'amplifiers': 'amplifier', 'усилители': 'amplifier',
+    'speakers': 'speaker', 'динамики': 'speaker',
+    'tweeters': 'tweeter', 'твитеры': 'tweeter', 'твиттеры': 'tweeter',
+    'midranges': 'midrange', 'мидрейнджи': 'midrange',
+    'accessories': 'accessory', 'аксессуары': 'accessory',
+}
 
 
 class Command(BaseCommand):
-    help = 'Import products from JSON file'
+    help = 'Import products from JSON file (streaming parse, bulk upsert by name)'
 
     def add_arguments(self, parser):
         parser.add_argument('json_file', type=str, help='Path to JSON file')
+        parser.add_argument('--full', action='store_true',
+                            help='The file is the full catalog: deactivate products missing from it')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+        parser.add_argument('--category', default='subwoofer', choices=[c for c, _ in Product.PRODUCT_CATEGORIES],
+                            help='Category for products whose source category is missing or unknown')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products per bulk upsert')
 
     def handle(self, *args, **options):
         json_file = options['json_file']
 
         if not os.path.exists(json_file):
-            self.stdout.write(self.style.ERROR(f"File {json_file} does not exist"))
+            raise CommandError(f"File {json_file} does not exist")
+
+        dry_run = options['dry_run']
+        self.default_category = options['category']
+        self.unknown_categories = Counter()
+        # Товары, у которых сменились бренд или серия: они входят в документ поиска заявок
+        self.renamed_product_ids = set()
+
+        # name -> (контрольная сумма, активен) для всех товаров: один запрос вместо SELECT на каждый товар
+        existing = {name: (checksum, is_active)
+                    for name, checksum, is_active in Product.objects.values_list('name', 'import_checksum', 'is_active')}
+
+        seen = set()
+        created, updated = [], []
+        unchanged_count = 0
+        skipped_count = 0
+        batch = []
+
+        with open(json_file, 'r', encoding='utf-8') as f, transaction.atomic():
+            for product_data in iter_json_array(f):
+                product = self.build_product(product_data)
+                if product is None or product.name in seen:
+                    skipped_count += 1
+                    continue
+                seen.add(product.name)
+
+                if product.name not in existing:
+                    created.append(product.name)
+                elif existing[product.name] != (product.import_checksum, True):
+                    updated.append(product.name)
+                else:
+                    unchanged_count += 1
+                    continue
+
+                batch.append(product)
+                if len(batch) >= options['batch_size']:
+                    self.flush(batch, dry_run)
+                    batch = []
+            self.flush(batch, dry_run)
+
+            deactivated = []
+            if options['full']:
+                deactivated = [name for name, (_, is_active) in existing.items() if is_active and name not in seen]
+                if not dry_run:
+                    for start in range(0, len(deactivated), options['batch_size']):
+                        Product.objects.filter(
+                            name__in=deactivated[start:start + options['batch_size']]
+                        ).update(is_active=False)
+
+        if dry_run:
+            self.write_diff('Would create', created)
+            self.write_diff('Would update', updated)
+            self.write_diff('Would deactivate', deactivated)
+        else:
+            invalidate_product_catalog()
+            if self.renamed_product_ids:
+                # bulk_create не вызывает сигналы (signals.product_saved) — индекс заявок пересобираем сами,
+                # после сброса кэша каталога, из которого index_repair_requests берёт товары
+                with transaction.atomic():
+                    index_repair_requests(
+                        RepairRequest.objects.filter(product_id__in=self.renamed_product_ids).only(*DOCUMENT_FIELDS)
+                    )
+
+        for category, count in self.unknown_categories.most_common():
+            self.stdout.write(self.style.WARNING(
+                f"Unknown category {category!r} in {count} products, imported as {self.default_category}"
+            ))
+
+        prefix = "Dry run" if dry_run else "Import completed!"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} Created: {len(created)}, Updated: {len(updated)}, Unchanged: {unchanged_count}, "
+            f"Deactivated: {len(deactivated)}, Skipped: {skipped_count}"
+        ))
+
+    def build_product(self, product_data):
+        name = (product_data.get('model') or '').strip()
+        if not name:
+            return None
+        specs = product_data.get('specifications') or {}
+
+        values = {
+            'brand': specs.get('Бренд'),
+            'series': specs.get('Серия'),
+            'category': self.map_category(product_data, specs),
+            'size': specs.get('Размер'),
+            'power_rms': specs.get('Мощность RMS'),
+            'power_max': specs.get('Мощность MAX'),
+            'external_id': product_data.get('product_id'),
+            'external_url': product_data.get('url'),
+        }
+        checksum = hashlib.sha256(json.dumps(values, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+        return Product(name=name, is_active=True, import_checksum=checksum, **values)
+
+    def map_category(self, product_data, specs):
+        source = product_data.get('category') or specs.get('Категория') or specs.get('Тип')
+        if not source and product_data.get('url'):
+            # .../products/subwoofers/<товар>/ — раздел каталога в URL
+            parts = [part for part in urlparse(product_data['url']).path.split('/') if part]
+            if 'products' in parts[:-1]:
+                source = parts[parts.index('products') + 1]
+        if not source:
+            return self.default_category
+
+        category = CATEGORY_ALIASES.get(str(source).strip().lower())
+        if category is None:
+            self.unknown_categories[source] += 1
+            return self.default_category
+        return category
+
+    def flush(self, batch, dry_run):
+        if not batch or dry_run:
             return
+        names = [product.name for product in batch]
+        previous = {
+            name: (brand, series)
+            for name, brand, series in Product.objects.filter(name__in=names).values_list('name', 'brand', 'series')
+        }
+        Product.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['name'],
+            update_fields=IMPORTED_FIELDS + ['is_active', 'import_checksum'],
+        )
+        # bulk_create не вызывает сигналы — слова для поиска пересобираем сами
+        products = list(Product.objects.filter(name__in=names).only('id', 'brand', 'series', 'name'))
+        index_products(products)
+        self.renamed_product_ids.update(
+            product.id for product in products
+            if product.name in previous and previous[product.name] != (product.brand, product.series)
+        )
 
-        with open(json_file, 'r', encoding='utf-8') as f:
-            products_data = json.load(f)
-
-        created_count = 0
-        updated_count = 0
-
-        for product_data in products_data:
-            specs = product_data.get('specifications', {})
-
-            product, created = Product.objects.update_or_create(
-                name=product_data['model'],
-                defaults={
-                    'brand': specs.get('Бренд'),
-                    'series': specs.get('Серия'),
-                    'category': 'subwoofer',
-                    'size': specs.get('Размер'),
-                    'power_rms': specs.get('Мощность RMS'),
-                    'power_max': specs.get('Мощность MAX'),
-                    'external_id': product_data.get('product_id'),
-                    'external_url': product_data.get('url'),
-                }
-            )
-
-            if created:
-                created_count += 1
-                self.stdout.write(f"Created: {product.name}")  # Используем просто name
-            else:
-                updated_count += 1
-                self.stdout.write(f"Updated: {product.name}")  # Используем просто name
-
-        self.stdout.write(
-            self.style.SUCCESS(
-                f"Import completed! Created: {created_count}, Updated: {updated_count}"
-            )
-        )
\ No newline at end of file
+    def write_diff(self, title, names, limit=20):
+        if not names:
+            return
+        self.stdout.write(f"{title} ({len(names)}):")
+        for name in names[:limit]:
+            self.stdout.write(f"  {name}")
+        if len(names) > limit:
+            self.stdout.write(f"  ... and {len(names) - limit} more")
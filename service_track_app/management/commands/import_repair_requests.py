@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from service_track_app.models import CustomUser
+from service_track_app.request_import import import_repair_requests
+
+
+class Command(BaseCommand):
+    help = 'Import repair requests from a dealer CSV/JSON/JSONL file on behalf of a dealer user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', type=str, help='Path to CSV, JSON or JSONL file')
+        parser.add_argument('--user', required=True, help='Username of the dealer who registers the requests')
+        parser.add_argument('--encoding', default='utf-8-sig', help='File encoding (e.g. cp1251)')
+        parser.add_argument('--rejects', help='Where to write rejected records (default: <file>.rejects.csv)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and roll back, do not import')
+
+    def handle(self, *args, **options):
+        path = options['file']
+        if not os.path.exists(path):
+            raise CommandError(f"File {path} does not exist")
+        try:
+            user = CustomUser.objects.select_related('dealer_company').get(username=options['user'], role='dealer')
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"Dealer user {options['user']} does not exist")
+
+        try:
+            with open(path, 'r', encoding=options['encoding']) as f:
+                result = import_repair_requests(user, f, path, dry_run=options['dry_run'])
+        except (LookupError, UnicodeDecodeError, ValueError) as e:
+            # Неизвестная кодировка, файл не в той кодировке или битый JSON
+            raise CommandError(f"Cannot read file: {e}")
+
+        if result.rejects:
+            rejects_path = options['rejects'] or f"{path}.rejects.csv"
+            with open(rejects_path, 'w', encoding='utf-8-sig', newline='') as f:
+                result.write_rejects_csv(f)
+            self.stdout.write(self.style.WARNING(f"Rejected {len(result.rejects)} records, see {rejects_path}"))
+
+        prefix = "Dry run" if options['dry_run'] else "Import completed!"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} Created: {result.created}, Rejected: {len(result.rejects)}"
+        ))
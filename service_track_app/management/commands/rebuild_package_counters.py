@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from service_track_app.models import Package
+from service_track_app.services import PACKAGE_COUNTER_FIELDS, count_package_requests, refresh_package_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify denormalized package request counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report packages with wrong counters, do not fix them')
+        parser.add_argument('--batch-size', type=int, default=500, help='Packages per batch')
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        batch_size = options['batch_size']
+
+        package_ids = list(Package.objects.order_by('id').values_list('id', flat=True))
+        mismatched = 0
+
+        for start in range(0, len(package_ids), batch_size):
+            batch_ids = package_ids[start:start + batch_size]
+            actual = count_package_requests(batch_ids)
+            stored = Package.objects.filter(id__in=batch_ids).values('id', *PACKAGE_COUNTER_FIELDS)
+
+            wrong_ids = []
+            for row in stored:
+                package_id = row.pop('id')
+                if row != actual[package_id]:
+                    wrong_ids.append(package_id)
+                    self.stdout.write(f"Package #{package_id}: stored {row}, actual {actual[package_id]}")
+            mismatched += len(wrong_ids)
+
+            if wrong_ids and not check_only:
+                with transaction.atomic():
+                    refresh_package_counters(wrong_ids)
+
+        if check_only:
+            style = self.style.SUCCESS if not mismatched else self.style.ERROR
+            self.stdout.write(style(f"Checked {len(package_ids)} packages, mismatched: {mismatched}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Checked {len(package_ids)} packages, fixed: {mismatched}"
+            ))
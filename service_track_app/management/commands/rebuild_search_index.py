@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from service_track_app.search import INDEX_BATCH_SIZE, rebuild_search_index, search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of repair requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=INDEX_BATCH_SIZE, help='Requests per index batch')
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        if backend is None:
+            self.stdout.write(self.style.WARNING("The database has no full-text index support, nothing to rebuild"))
+            return
+
+        started = time.monotonic()
+        with transaction.atomic():
+            count = rebuild_search_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Search index rebuilt ({backend}): {count} requests in {time.monotonic() - started:.1f}s"
+        ))
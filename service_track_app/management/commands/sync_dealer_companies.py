@@ -0,0 +1,208 @@
+import os
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from service_track_app.importers import header_map, iter_records, parse_bool
+from service_track_app.models import CustomUser, DealerCompany
+
+SYNC_FIELDS = ['name', 'inn', 'full_name', 'document', 'relation_type', 'region', 'is_active']
+
+# Синонимы заголовков из выгрузок учётной системы
+HEADER_ALIASES = {
+    'контрагент': 'name',
+    'наименование полное': 'full_name',
+    'users': 'users',
+    'пользователи': 'users',
+    'логины': 'users',
+}
+
+# Значение колонки пользователей, которое отвязывает от компании всех; пустая ячейка ничего не меняет
+CLEAR_USERS = '-'
+
+
+class Command(BaseCommand):
+    help = (
+        'Synchronize dealer companies from a CSV/JSON counterparty export (upsert by code). '
+        f'A users cell lists the logins of the company; a blank cell keeps them, "{CLEAR_USERS}" unlinks all.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', type=str, help='Path to CSV or JSON file')
+        parser.add_argument('--encoding', default='utf-8-sig', help='CSV file encoding (e.g. cp1251)')
+        parser.add_argument('--keep-missing', action='store_true',
+                            help='Do not deactivate companies missing from the export')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+        parser.add_argument('--batch-size', type=int, default=500, help='Companies per bulk upsert')
+
+    def handle(self, *args, **options):
+        path = options['file']
+        if not os.path.exists(path):
+            raise CommandError(f"File {path} does not exist")
+
+        dry_run = options['dry_run']
+        headers = header_map(DealerCompany, HEADER_ALIASES)
+
+        existing = {company['code']: company for company in DealerCompany.objects.values('code', *SYNC_FIELDS)}
+        seen = set()
+        created, updated = [], []
+        unchanged_count = 0
+        skipped = []
+        # (номер записи, ошибки) — значения, которые не проходят проверку полей DealerCompany
+        invalid = []
+        # code -> логины пользователей, если в выгрузке есть колонка с пользователями
+        company_users = {}
+        batch = []
+
+        with open(path, 'r', encoding=options['encoding']) as f, transaction.atomic():
+            for line_number, record in enumerate(iter_records(f, path), start=1):
+                values = {headers[key.strip().lower()]: value for key, value in record.items()
+                          if key.strip().lower() in headers}
+                code = str(values.get('code') or '').strip()
+                if not code or code in seen:
+                    skipped.append(line_number)
+                    continue
+                seen.add(code)
+
+                users = values.pop('users', None)
+                current = existing.get(code)
+                company = self.build_company(code, values, current)
+                errors = self.validate_company(company, values)
+                if errors:
+                    invalid.append((line_number, errors))
+                    continue
+
+                if isinstance(users, str):
+                    users = users.replace(';', ',').split(',')
+                usernames = {str(username).strip() for username in users or [] if str(username).strip()}
+                if usernames == {CLEAR_USERS}:
+                    company_users[code] = set()
+                elif usernames:
+                    company_users[code] = usernames
+
+                if current is None:
+                    created.append(code)
+                elif any(getattr(company, field) != current[field] for field in SYNC_FIELDS):
+                    updated.append(code)
+                else:
+                    unchanged_count += 1
+                    continue
+
+                batch.append(company)
+                if len(batch) >= options['batch_size']:
+                    self.flush(batch, dry_run)
+                    batch = []
+            self.flush(batch, dry_run)
+
+            deactivated = []
+            if not options['keep_missing']:
+                deactivated = [code for code, company in existing.items() if company['is_active'] and code not in seen]
+                if deactivated and not dry_run:
+                    DealerCompany.objects.filter(code__in=deactivated).update(is_active=False)
+
+            linked, unlinked, unknown_users = self.sync_users(company_users, dry_run)
+
+        if dry_run:
+            self.write_diff('Would create', created)
+            self.write_diff('Would update', updated)
+            self.write_diff('Would deactivate', deactivated)
+        if unknown_users:
+            self.write_diff('Unknown users', sorted(unknown_users))
+        for line_number, errors in invalid[:20]:
+            self.stdout.write(self.style.WARNING(f"Record {line_number} rejected: {'; '.join(errors)}"))
+        if len(invalid) > 20:
+            self.stdout.write(self.style.WARNING(f"... and {len(invalid) - 20} more rejected records"))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f"Skipped {len(skipped)} records without code or with duplicate code (records: "
+                f"{', '.join(map(str, skipped[:20]))}{' ...' if len(skipped) > 20 else ''})"
+            ))
+
+        prefix = "Dry run" if dry_run else "Sync completed!"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} Created: {len(created)}, Updated: {len(updated)}, Unchanged: {unchanged_count}, "
+            f"Deactivated: {len(deactivated)}, Rejected: {len(invalid)}, Users linked: {linked}, unlinked: {unlinked}"
+        ))
+
+    def build_company(self, code, values, current):
+        """DealerCompany из записи выгрузки; колонки, которых нет в выгрузке, сохраняют текущие значения."""
+        data = {field: (current or {}).get(field) for field in SYNC_FIELDS}
+        for field in SYNC_FIELDS:
+            if field in values:
+                value = values[field]
+                data[field] = parse_bool(value) if field == 'is_active' else (str(value).strip() or None)
+        if 'is_active' not in values:
+            # Есть в выгрузке — значит действующий контрагент
+            data['is_active'] = True
+        data['name'] = data['name'] or data['full_name'] or code
+        return DealerCompany(code=code, **data)
+
+    def validate_company(self, company, values):
+        """
+        Ошибки в значениях из выгрузки: проверка поля модели (choices, длина). bulk_create её не делает,
+        а неизвестное значение иначе молча попало бы в справочник.
+        """
+        errors = []
+        for field_name in SYNC_FIELDS:
+            if field_name not in values:
+                continue
+            field = DealerCompany._meta.get_field(field_name)
+            try:
+                field.clean(getattr(company, field_name), company)
+            except ValidationError as e:
+                errors.append(f"{field_name}={getattr(company, field_name)!r}: {' '.join(e.messages)}")
+        return errors
+
+    def flush(self, batch, dry_run):
+        if not batch or dry_run:
+            return
+        DealerCompany.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['code'],
+            update_fields=SYNC_FIELDS,
+        )
+
+    def sync_users(self, company_users, dry_run):
+        """
+        Привязывает пользователей к компаниям по спискам логинов из выгрузки: у компании остаются
+        ровно перечисленные пользователи. Возвращает (привязано, отвязано, неизвестные логины).
+        """
+        if not company_users:
+            return 0, 0, set()
+
+        company_ids = dict(DealerCompany.objects.filter(code__in=company_users).values_list('code', 'id'))
+        all_usernames = set().union(*company_users.values())
+        users = {username: (user_id, dealer_company_id) for username, user_id, dealer_company_id in
+                 CustomUser.objects.filter(username__in=all_usernames).values_list('username', 'id', 'dealer_company_id')}
+        unknown_users = all_usernames - users.keys()
+
+        to_link = defaultdict(list)
+        for code, usernames in company_users.items():
+            # Компания ещё не создана только в режиме --dry-run
+            company_id = company_ids.get(code, code)
+            for username in usernames & users.keys():
+                user_id, current_company_id = users[username]
+                if current_company_id != company_id:
+                    to_link[company_id].append(user_id)
+
+        listed_user_ids = [users[username][0] for username in all_usernames & users.keys()]
+        to_unlink = CustomUser.objects.filter(dealer_company_id__in=company_ids.values()).exclude(id__in=listed_user_ids)
+        unlinked = to_unlink.count()
+
+        if not dry_run:
+            to_unlink.update(dealer_company=None)
+            for company_id, user_ids in to_link.items():
+                CustomUser.objects.filter(id__in=user_ids).update(dealer_company_id=company_id)
+
+        return sum(len(user_ids) for user_ids in to_link.values()), unlinked, unknown_users
+
+    def write_diff(self, title, codes, limit=20):
+        if not codes:
+            return
+        self.stdout.write(f"{title} ({len(codes)}):")
+        for code in codes[:limit]:
+            self.stdout.write(f"  {code}")
+        if len(codes) > limit:
+            self.stdout.write(f"  ... and {len(codes) - limit} more")
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+def fill_serial_key(apps, schema_editor):
+    RepairRequest = apps.get_model('service_track_app', 'RepairRequest')
+    batch = []
+    for repair_request in RepairRequest.objects.only('id', 'serial_number').iterator(chunk_size=2000):
+        repair_request.serial_key = "".join((repair_request.serial_number or "").split()).upper()
+        batch.append(repair_request)
+        if len(batch) >= 2000:
+            RepairRequest.objects.bulk_update(batch, ['serial_key'])
+            batch = []
+    if batch:
+        RepairRequest.objects.bulk_update(batch, ['serial_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_track_app', '0017_alter_repairrequest_acoustics_repair_subtype_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repairrequest',
+            name='serial_key',
+            field=models.CharField(blank=True, editable=False, max_length=50, verbose_name='Ключ серийного номера'),
+        ),
+        migrations.RunPython(fill_serial_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='repairrequest',
+            index=models.Index(fields=['serial_key', '-created_at'], name='repairrequest_serial_key_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:00
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_package_counters(apps, schema_editor):
+    Package = apps.get_model('service_track_app', 'Package')
+    RepairRequest = apps.get_model('service_track_app', 'RepairRequest')
+    rows = (
+        RepairRequest.objects.filter(package__isnull=False)
+        .values('package_id')
+        .annotate(
+            requests_total=Count('id', distinct=True),
+            requests_accepted=Count('id', distinct=True, filter=Q(status='accepted_by_dealer')),
+            requests_closed=Count('id', distinct=True, filter=Q(status='closed')),
+            requests_rejected=Count('id', distinct=True, filter=Q(status='rejected')),
+            requests_with_photos=Count('id', distinct=True, filter=Q(photos__isnull=False)),
+        )
+        .order_by()
+    )
+    packages = [Package(id=row.pop('package_id'), **row) for row in rows]
+    Package.objects.bulk_update(
+        packages,
+        ['requests_total', 'requests_accepted', 'requests_closed', 'requests_rejected', 'requests_with_photos'],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_track_app', '0018_repairrequest_serial_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='requests_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='Всего заявок'),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='requests_accepted',
+            field=models.PositiveIntegerField(default=0, verbose_name='Принято заявок'),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='requests_closed',
+            field=models.PositiveIntegerField(default=0, verbose_name='Закрыто заявок'),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='requests_rejected',
+            field=models.PositiveIntegerField(default=0, verbose_name='Отклонено заявок'),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='requests_with_photos',
+            field=models.PositiveIntegerField(default=0, verbose_name='Заявок с фото'),
+        ),
+        migrations.RunPython(fill_package_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_track_app', '0020_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repairrequestphoto',
+            name='thumbnail',
+            field=models.ImageField(blank=True, upload_to='repair_photos/thumbs/', verbose_name='Миниатюра'),
+        ),
+        migrations.AddField(
+            model_name='repairrequestphoto',
+            name='preview',
+            field=models.ImageField(blank=True, upload_to='repair_photos/previews/', verbose_name='Превью'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:00
+
+import django.core.validators
+import service_track_app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_track_app', '0022_videoupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Файл')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='repairrequestphoto',
+            name='photo',
+            field=models.ImageField(storage=service_track_app.storage.select_media_storage, upload_to='repair_photos/', verbose_name='Фото товара'),
+        ),
+        migrations.AlterField(
+            model_name='repairrequestphoto',
+            name='preview',
+            field=models.ImageField(blank=True, storage=service_track_app.storage.select_media_storage, upload_to='repair_photos/previews/', verbose_name='Превью'),
+        ),
+        migrations.AlterField(
+            model_name='repairrequestphoto',
+            name='thumbnail',
+            field=models.ImageField(blank=True, storage=service_track_app.storage.select_media_storage, upload_to='repair_photos/thumbs/', verbose_name='Миниатюра'),
+        ),
+        migrations.AlterField(
+            model_name='repairrequestvideo',
+            name='video',
+            field=models.FileField(storage=service_track_app.storage.select_media_storage, upload_to='repair_videos/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['mp4', 'avi', 'mov', 'wmv'])], verbose_name='Видео товара'),
+        ),
+    ]
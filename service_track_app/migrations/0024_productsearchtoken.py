@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:00
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def index_existing_products(apps, schema_editor):
+    Product = apps.get_model('service_track_app', 'Product')
+    ProductSearchToken = apps.get_model('service_track_app', 'ProductSearchToken')
+    tokens = []
+    for product in Product.objects.all().iterator():
+        text = ' '.join(filter(None, [product.brand, product.series, product.name])).lower()
+        tokens.extend(ProductSearchToken(product=product, token=token[:100]) for token in set(re.findall(r'\w+', text)))
+    ProductSearchToken.objects.bulk_create(tokens, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_track_app', '0023_mediablob_content_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(db_index=True, max_length=100, verbose_name='Слово')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='service_track_app.product')),
+            ],
+            options={
+                'verbose_name': 'Слово для поиска товара',
+                'verbose_name_plural': 'Слова для поиска товаров',
+            },
+        ),
+        migrations.RunPython(index_existing_products, migrations.RunPython.noop),
+    ]
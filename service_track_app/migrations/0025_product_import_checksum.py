@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_track_app', '0024_productsearchtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='import_checksum',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Контрольная сумма импорта'),
+        ),
+    ]
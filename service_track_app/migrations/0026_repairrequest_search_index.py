@@ -0,0 +1,78 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:00
+
+from django.db import migrations
+
+# Таблица индекса полнотекстового поиска по заявкам (см. service_track_app/search.py)
+SQLITE_CREATE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS service_track_app_repairrequest_search USING fts5(
+    serial, phone, customer, product, problem, detected, malfunction,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3 4'
+)
+"""
+SQLITE_FILL = """
+INSERT INTO service_track_app_repairrequest_search
+    (rowid, serial, phone, customer, product, problem, detected, malfunction)
+SELECT r.id,
+       r.serial_number || ' ' || r.serial_key,
+       REPLACE(COALESCE(r.customer_phone, ''), '+', ''),
+       COALESCE(r.customer_name, ''),
+       TRIM(COALESCE(p.brand, '') || ' ' || COALESCE(p.series, '') || ' ' || p.name),
+       r.problem_description,
+       r.detected_problem,
+       r.malfunction_formulation
+FROM service_track_app_repairrequest r
+JOIN service_track_app_product p ON p.id = r.product_id
+"""
+
+POSTGRESQL_CREATE = """
+CREATE TABLE IF NOT EXISTS service_track_app_repairrequest_search (
+    repair_request_id bigint PRIMARY KEY
+        REFERENCES service_track_app_repairrequest (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+    document tsvector NOT NULL
+);
+CREATE INDEX IF NOT EXISTS repairrequest_search_document_idx
+    ON service_track_app_repairrequest_search USING gin (document)
+"""
+POSTGRESQL_FILL = """
+INSERT INTO service_track_app_repairrequest_search (repair_request_id, document)
+SELECT r.id,
+       setweight(to_tsvector('simple', r.serial_number || ' ' || r.serial_key), 'A')
+       || setweight(to_tsvector('simple', REPLACE(COALESCE(r.customer_phone, ''), '+', '')), 'A')
+       || setweight(to_tsvector('russian', COALESCE(r.customer_name, '')), 'B')
+       || setweight(to_tsvector('russian', CONCAT_WS(' ', p.brand, p.series, p.name)), 'B')
+       || setweight(to_tsvector('russian', r.problem_description), 'C')
+       || setweight(to_tsvector('russian', r.detected_problem), 'C')
+       || setweight(to_tsvector('russian', r.malfunction_formulation), 'C')
+FROM service_track_app_repairrequest r
+JOIN service_track_app_product p ON p.id = r.product_id
+"""
+
+DROP = "DROP TABLE IF EXISTS service_track_app_repairrequest_search"
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+        schema_editor.execute(SQLITE_FILL)
+    elif vendor == 'postgresql':
+        for statement in POSTGRESQL_CREATE.split(';'):
+            schema_editor.execute(statement)
+        schema_editor.execute(POSTGRESQL_FILL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_track_app', '0025_product_import_checksum'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_track_app', '0026_repairrequest_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repairrequest',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Версия'),
+        ),
+    ]
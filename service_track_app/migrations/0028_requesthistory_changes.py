@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_track_app', '0027_repairrequest_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requesthistory',
+            name='changes',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Изменения'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_event_types(apps, schema_editor):
+    # Новое поле заполнено значением 'status'; записи без смены статуса — комментарии или правки полей
+    RequestHistory = apps.get_model('service_track_app', 'RequestHistory')
+    same_status = RequestHistory.objects.filter(old_status=F('new_status'))
+    same_status.filter(changes={}).update(event_type='comment')
+    same_status.exclude(changes={}).update(event_type='edit')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_track_app', '0028_requesthistory_changes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requesthistory',
+            name='event_type',
+            field=models.CharField(choices=[('status', 'Смена статуса'), ('comment', 'Комментарий'), ('edit', 'Изменение полей')], default='status', max_length=20, verbose_name='Тип события'),
+        ),
+        migrations.RunPython(backfill_event_types, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='requesthistory',
+            name='repair_request',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='history', to='service_track_app.repairrequest'),
+        ),
+        migrations.AddIndex(
+            model_name='requesthistory',
+            index=models.Index(fields=['repair_request', 'event_type', 'changed_at'], name='requesthistory_event_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:00
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_track_app', '0029_requesthistory_event_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRepairRequest',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('serial_key', models.CharField(blank=True, max_length=50, verbose_name='Ключ серийного номера')),
+                ('status', models.CharField(choices=[('accepted_by_dealer', 'Товар принят дилером'), ('waiting', 'Ожидает'), ('sent_to_service', 'Отправлено в сервисный центр'), ('closed', 'Закрыта'), ('rejected', 'Отклонена')], max_length=20, verbose_name='Статус заявки')),
+                ('created_at', models.DateTimeField(verbose_name='Создана')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Перенесена в архив')),
+                ('media_archive', models.CharField(blank=True, max_length=255, verbose_name='Архив медиа')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Данные заявки')),
+                ('package', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_requests', to='service_track_app.package')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_requests', to='service_track_app.product', verbose_name='Товар')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedMediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('photo', 'Фото'), ('video', 'Видео')], max_length=10, verbose_name='Тип')),
+                ('member', models.CharField(max_length=100, verbose_name='Файл в архиве')),
+                ('original_name', models.CharField(max_length=255, verbose_name='Исходный файл')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Размер файла')),
+                ('repair_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='media', to='service_track_app.archivedrepairrequest')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedRequestHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('old_status', models.CharField(blank=True, choices=[('accepted_by_dealer', 'Товар принят дилером'), ('waiting', 'Ожидает'), ('sent_to_service', 'Отправлено в сервисный центр'), ('closed', 'Закрыта'), ('rejected', 'Отклонена')], max_length=50, null=True)),
+                ('new_status', models.CharField(choices=[('accepted_by_dealer', 'Товар принят дилером'), ('waiting', 'Ожидает'), ('sent_to_service', 'Отправлено в сервисный центр'), ('closed', 'Закрыта'), ('rejected', 'Отклонена')], max_length=50)),
+                ('event_type', models.CharField(choices=[('status', 'Смена статуса'), ('comment', 'Комментарий'), ('edit', 'Изменение полей')], max_length=20, verbose_name='Тип события')),
+                ('comment', models.TextField(blank=True, null=True)),
+                ('changes', models.JSONField(blank=True, default=dict, verbose_name='Изменения')),
+                ('changed_at', models.DateTimeField()),
+                ('changed_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('repair_request', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='history', to='service_track_app.archivedrepairrequest')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedrepairrequest',
+            index=models.Index(fields=['serial_key', '-created_at'], name='archivedrequest_serial_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedrequesthistory',
+            index=models.Index(fields=['repair_request', 'event_type', 'changed_at'], name='archivedhistory_event_idx'),
+        ),
+    ]
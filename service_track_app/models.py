@@ -1,8 +1,15 @@
+import uuid
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import F
 from django.core.validators import RegexValidator
 from phonenumber_field.modelfields import PhoneNumberField
 from django.core.validators import FileExtensionValidator
+from django.urls import reverse
+from .storage import media_storage, select_media_storage
 
 
 class CustomUser(AbstractUser):
@@ -48,12 +55,25 @@ class Package(models.Model):
     returned_at = models.DateTimeField("Дата возврата", null=True, blank=True)
     return_reason = models.TextField("Причина возврата", blank=True, null=True)
 
+    # Счётчики заявок пакета, поддерживаются services.refresh_package_counters
+    requests_total = models.PositiveIntegerField("Всего заявок", default=0)
+    requests_accepted = models.PositiveIntegerField("Принято заявок", default=0)
+    requests_closed = models.PositiveIntegerField("Закрыто заявок", default=0)
+    requests_rejected = models.PositiveIntegerField("Отклонено заявок", default=0)
+    requests_with_photos = models.PositiveIntegerField("Заявок с фото", default=0)
+
+    class Meta:
+        indexes = [
+            # Keyset-пагинация списков пакетов
+            models.Index(fields=['-created_at', '-id'], name='package_created_idx'),
+        ]
+
     def __str__(self):
         return f"Пакет #{self.id} — {self.created_at.strftime('%d.%m.%Y %H:%M')}"
 
     @property
     def request_count(self):
-        return self.requests.count()
+        return self.requests_total
 
 
 phone_validator = RegexValidator(
@@ -86,6 +106,8 @@ class Product(models.Model):
     external_url = models.URLField(verbose_name="Ссылка на товар", blank=True, null=True)
     is_active = models.BooleanField(default=True, verbose_name="Активный")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    # Хэш импортированных полей: import_products пропускает товары, которые не изменились
+    import_checksum = models.CharField("Контрольная сумма импорта", max_length=64, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Товар"
@@ -109,7 +131,87 @@ class Product(models.Model):
         return " ".join(parts)
 
 
-class RepairRequest(models.Model):
+class ProductSearchToken(models.Model):
+    """Слова из бренда, серии и названия товара для поиска по префиксу (заполняются в catalog.index_products)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField("Слово", max_length=100, db_index=True)
+
+    class Meta:
+        verbose_name = "Слово для поиска товара"
+        verbose_name_plural = "Слова для поиска товаров"
+
+
+class ChangeTrackingMixin(models.Model):
+    """
+    Запоминает значения полей TRACKED_FIELDS при создании экземпляра (в том числе при загрузке из БД)
+    и после каждого save(), поэтому прежние значения и изменения известны без повторного чтения строки.
+    Отложенные (.only/.defer) поля не отслеживаются.
+    """
+    TRACKED_FIELDS = ()
+
+    class Meta:
+        abstract = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.remember_tracked_values()
+
+    @classmethod
+    def _tracked_attnames(cls):
+        # (поле, attname) — считаем один раз на класс
+        if '_tracked_attnames_cache' not in cls.__dict__:
+            cls._tracked_attnames_cache = [(name, cls._meta.get_field(name).attname) for name in cls.TRACKED_FIELDS]
+        return cls._tracked_attnames_cache
+
+    def remember_tracked_values(self):
+        # Через __dict__, чтобы отложенные поля не догружались отдельным запросом
+        values = self.__dict__
+        self._tracked_values = {name: values[attname] for name, attname in self._tracked_attnames() if attname in values}
+
+    def initial_value(self, name):
+        return self._tracked_values.get(name)
+
+    def changed_fields(self, update_fields=None):
+        """{поле: (было, стало)} по отслеживаемым полям; при update_fields — только по сохраняемым."""
+        changes = {}
+        for name, attname in self._tracked_attnames():
+            if update_fields is not None and name not in update_fields and attname not in update_fields:
+                continue
+            if name in self._tracked_values and attname in self.__dict__:
+                old, new = self._tracked_values[name], self.__dict__[attname]
+                if old != new:
+                    changes[name] = (old, new)
+        return changes
+
+
+def _history_value(value):
+    # Значение для JSON-диффа: даты, суммы и телефоны — строками
+    return value if value is None or isinstance(value, (bool, int, float, str)) else str(value)
+
+
+def normalize_serial_number(value):
+    """Приводит серийный номер к виду для поиска: без пробелов, в верхнем регистре."""
+    return "".join((value or "").split()).upper()
+
+
+class RepairRequest(ChangeTrackingMixin, models.Model):
+    # Поля, изменения которых попадают в историю (как в форме редактирования заявки)
+    HISTORY_FIELDS = (
+        'status', 'serial_number', 'product', 'purchase_date', 'warranty_status', 'problem_description',
+        'additional_notes', 'customer_name', 'customer_phone', 'customer_email',
+        'diagnosis_date', 'completion_date', 'service_employee', 'conclusion', 'decision',
+        'malfunction_formulation', 'price_type', 'act_status',
+        'refusal_reason', 'detected_problem', 'repair_date', 'repair_type', 'acoustics_repair_subtype',
+        'amplifier_repair_subtype', 'repair_performed', 'additional_info', 'internal_comment',
+        'labor_cost', 'parts_cost', 'total_cost', 'parts_discount', 'paid_by_client', 'payment_date',
+    )
+    # serial_key и package — для сброса кэшей и счётчиков в signals.py, в историю не попадают
+    TRACKED_FIELDS = HISTORY_FIELDS + ('serial_key', 'package')
+
+    # Кто и с каким комментарием меняет заявку — для записи истории при save()
+    history_user = None
+    history_comment = None
+
     STATUS_CHOICES = [
         ('accepted_by_dealer', 'Товар принят дилером'),
         ('waiting', 'Ожидает'),
@@ -132,6 +234,8 @@ class RepairRequest(models.Model):
     ]
 
     serial_number = models.CharField("Серийный номер товара", max_length=50)
+    # Нормализованный серийный номер для индексированного поиска (см. normalize_serial_number)
+    serial_key = models.CharField("Ключ серийного номера", max_length=50, blank=True, editable=False)
     product = models.ForeignKey(
         Product,
         on_delete=models.PROTECT,
@@ -345,25 +449,92 @@ class RepairRequest(models.Model):
     paid_by_client = models.DecimalField("Оплачено клиентом", max_digits=10, decimal_places=2, null=True, blank=True)
     payment_date = models.DateField("Дата оплаты", null=True, blank=True)
 
+    # Версия строки: растёт при каждом сохранении, по ней автосохранение отклоняет устаревшие правки
+    version = models.PositiveIntegerField("Версия", default=1, editable=False)
+
     # ========== КОНЕЦ: ДОБАВЛЕННЫЕ ПОЛЯ ДЛЯ ДИАГНОСТИКИ ==========
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['serial_key', '-created_at'], name='repairrequest_serial_key_idx'),
+            # Keyset-пагинация списка поступивших заявок
+            models.Index(fields=['status', '-created_at', '-id'], name='repairrequest_status_idx'),
+        ]
+
     def __str__(self):
         return f"Заявка #{self.id} — {self.serial_number}"
 
+    def save(self, *args, **kwargs):
+        self.serial_key = normalize_serial_number(self.serial_number)
+        adding = self._state.adding
+        if not adding:
+            self.version += 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = {*update_fields, 'version'}
+            if 'serial_number' in update_fields:
+                update_fields.add('serial_key')
+            kwargs['update_fields'] = update_fields
+
+        # Дифф для истории — по значениям, запомненным при загрузке; создание заявки пишут сами вьюхи
+        changes = {} if adding else {
+            name: [_history_value(old), _history_value(new)]
+            for name, (old, new) in self.changed_fields(update_fields).items()
+            # NULL -> '' при сохранении формы — не изменение
+            if name in self.HISTORY_FIELDS and not (old in (None, '') and new in (None, ''))
+        }
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if changes:
+                RequestHistory.objects.create(
+                    repair_request=self,
+                    changed_by=self.history_user,
+                    old_status=self.initial_value('status'),
+                    new_status=self.status,
+                    comment=self.history_comment,
+                    changes=changes,
+                )
+        self.remember_tracked_values()
+
 
 class RepairRequestPhoto(models.Model):
     repair_request = models.ForeignKey(RepairRequest, on_delete=models.CASCADE, related_name='photos')
-    photo = models.ImageField("Фото товара", upload_to='repair_photos/')
+    photo = models.ImageField("Фото товара", upload_to='repair_photos/', storage=select_media_storage)
+    # Производные изображения строятся при сохранении (см. images.encode_photo_derivatives)
+    thumbnail = models.ImageField("Миниатюра", upload_to='repair_photos/thumbs/', blank=True,
+                                  storage=select_media_storage)
+    preview = models.ImageField("Превью", upload_to='repair_photos/previews/', blank=True,
+                                storage=select_media_storage)
 
     def __str__(self):
         return f"Фото для {self.repair_request.serial_number}"
 
+    def save(self, *args, **kwargs):
+        from .images import encode_photo_derivatives, save_photo_derivatives
+
+        # Декодирование и ресайз — до транзакции: на SQLite (IMMEDIATE) она держит блокировку записи всей БД
+        derivatives = encode_photo_derivatives(self) if self.photo and not self.thumbnail else None
+        # Одна транзакция от записи файлов до учёта ссылок в MediaBlob (см. MediaBlob.lock)
+        with transaction.atomic():
+            if derivatives:
+                save_photo_derivatives(self, derivatives)
+            super().save(*args, **kwargs)
+
+    @property
+    def thumbnail_url(self):
+        return self.thumbnail.url if self.thumbnail else self.photo.url
+
+    @property
+    def preview_url(self):
+        return self.preview.url if self.preview else self.photo.url
+
 
 class RepairRequestVideo(models.Model):
     repair_request = models.ForeignKey(RepairRequest, on_delete=models.CASCADE, related_name='videos')
     video = models.FileField(
         "Видео товара",
         upload_to='repair_videos/',
+        storage=select_media_storage,
         validators=[
             FileExtensionValidator(allowed_extensions=['mp4', 'avi', 'mov', 'wmv']),
         ]
@@ -372,6 +543,95 @@ class RepairRequestVideo(models.Model):
     def __str__(self):
         return f"Видео для {self.repair_request.serial_number}"
 
+    def save(self, *args, **kwargs):
+        # Одна транзакция от записи файла до учёта ссылки в MediaBlob (см. MediaBlob.lock)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+# Файловые поля медиа, которые хранятся с адресацией по содержимому и учитываются в MediaBlob
+MEDIA_FILE_FIELDS = {
+    RepairRequestPhoto: ('photo', 'thumbnail', 'preview'),
+    RepairRequestVideo: ('video',),
+}
+
+
+class MediaBlob(models.Model):
+    """
+    Учёт ссылок на файл медиа: один файл на диске может использоваться несколькими фото/видео.
+    Строка с ref_count=0 — файл ждёт удаления; строка остаётся, пока файл не удалён, и служит блокировкой:
+    загрузка и удаление одного файла идут под блокировкой его строки (lock), поэтому удаление не заберёт
+    файл, на который новая загрузка уже рассчитывает.
+    """
+    name = models.CharField("Файл", max_length=255, unique=True)
+    ref_count = models.PositiveIntegerField("Число ссылок", default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+    @classmethod
+    def lock(cls, name):
+        """
+        Строка файла под блокировкой (создаётся с ref_count=0, если её нет). Вызывается внутри транзакции;
+        блокировка держится до её конца, поэтому запись файла и acquire() должны быть в одной транзакции.
+        """
+        cls.objects.get_or_create(name=name)
+        return cls.objects.select_for_update().get(name=name)
+
+    @classmethod
+    def acquire(cls, name):
+        if not cls.objects.filter(name=name).update(ref_count=F('ref_count') + 1):
+            _, created = cls.objects.get_or_create(name=name, defaults={'ref_count': 1})
+            if not created:
+                cls.objects.filter(name=name).update(ref_count=F('ref_count') + 1)
+
+    @classmethod
+    def release(cls, name):
+        """Снимает ссылку; файл удаляется с диска после коммита, когда ссылок не осталось."""
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                # Файл вне учёта (загружен до дедупликации) — не трогаем
+                return
+            if blob.ref_count > 1:
+                cls.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+                return
+            cls.objects.filter(pk=blob.pk).update(ref_count=0)
+        transaction.on_commit(lambda: cls.delete_unreferenced(name))
+
+    @classmethod
+    def delete_unreferenced(cls, name):
+        """Удаляет файл и его строку, если ссылок на него нет. Вызывается после коммита транзакции, обнулившей ссылки."""
+        with transaction.atomic():
+            # Под блокировкой строки: пока шла транзакция, тот же файл мог загрузиться заново
+            blob = cls.objects.select_for_update().filter(name=name, ref_count=0).first()
+            if blob is not None:
+                media_storage.delete(name)
+                blob.delete()
+
+
+class VideoUpload(models.Model):
+    """Сессия поблочной (возобновляемой) загрузки видео; файл прикрепляется к заявке по token."""
+    STATUS_CHOICES = [
+        ('uploading', 'Загружается'),
+        ('complete', 'Загружено'),
+        ('attached', 'Прикреплено к заявке'),
+    ]
+
+    token = models.UUIDField("Токен загрузки", default=uuid.uuid4, unique=True, editable=False)
+    created_by = models.ForeignKey("CustomUser", on_delete=models.CASCADE, related_name="video_uploads")
+    filename = models.CharField("Имя файла", max_length=255)
+    size = models.PositiveBigIntegerField("Размер файла")
+    offset = models.PositiveBigIntegerField("Получено байт", default=0)
+    sha256 = models.CharField("SHA-256", max_length=64, blank=True)
+    status = models.CharField("Статус", max_length=20, choices=STATUS_CHOICES, default='uploading')
+    video = models.OneToOneField(RepairRequestVideo, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name="upload")
+    created_at = models.DateTimeField("Создана", auto_now_add=True)
+
+    def __str__(self):
+        return f"Загрузка {self.filename} ({self.offset}/{self.size})"
+
 
 class RequestHistory(models.Model):
     STATUS_CHOICES = [
@@ -382,12 +642,138 @@ class RequestHistory(models.Model):
         ('rejected', 'Отклонена'),
     ]
 
-    repair_request = models.ForeignKey('RepairRequest', on_delete=models.CASCADE, related_name='history')
+    EVENT_TYPE_CHOICES = [
+        ('status', 'Смена статуса'),
+        ('comment', 'Комментарий'),
+        ('edit', 'Изменение полей'),
+    ]
+
+    # Отдельный индекс по заявке не нужен: её покрывает составной индекс ниже
+    repair_request = models.ForeignKey('RepairRequest', on_delete=models.CASCADE, related_name='history',
+                                       db_index=False)
     changed_by = models.ForeignKey('CustomUser', on_delete=models.SET_NULL, null=True)
     old_status = models.CharField(max_length=50, blank=True, null=True, choices=STATUS_CHOICES)
     new_status = models.CharField(max_length=50, choices=STATUS_CHOICES)
+    # Вычисляется в save(); bulk_create в проекте пишет только смены статуса — отсюда значение по умолчанию
+    event_type = models.CharField("Тип события", max_length=20, choices=EVENT_TYPE_CHOICES, default='status')
     comment = models.TextField(blank=True, null=True)
+    # Изменённые поля заявки: {поле: [было, стало]}
+    changes = models.JSONField("Изменения", default=dict, blank=True)
     changed_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Лента статусов и история заявки — диапазон по индексу, без сравнения old_status с new_status
+            models.Index(fields=['repair_request', 'event_type', 'changed_at'], name='requesthistory_event_idx'),
+        ]
+
+    def __str__(self):
+        return f"История заявки #{self.repair_request.id} — {self.new_status} ({self.changed_at})"
+
+    def detect_event_type(self):
+        if self.old_status != self.new_status:
+            return 'status'
+        return 'edit' if self.changes else 'comment'
+
+    def save(self, *args, **kwargs):
+        self.event_type = self.detect_event_type()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'event_type'}
+        super().save(*args, **kwargs)
+
+
+class ArchivedRepairRequest(models.Model):
+    """
+    Закрытая или отклонённая заявка, перенесённая из рабочей таблицы в архив (см. archive.py).
+    id — тот же, что у исходной заявки; колонками хранятся поля для поиска, остальное — снимок data.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    serial_key = models.CharField("Ключ серийного номера", max_length=50, blank=True)
+    status = models.CharField("Статус заявки", max_length=20, choices=RepairRequest.STATUS_CHOICES)
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, verbose_name="Товар",
+                                related_name='archived_requests')
+    # Для счётчиков пакета (services.count_package_requests)
+    package = models.ForeignKey(Package, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name="archived_requests")
+    created_at = models.DateTimeField("Создана")
+    archived_at = models.DateTimeField("Перенесена в архив", auto_now_add=True)
+    # Сжатый архив фото и видео заявки относительно REQUEST_ARCHIVE_ROOT; пусто — файлов не было
+    media_archive = models.CharField("Архив медиа", max_length=255, blank=True)
+    # Поля заявки в формате сериализатора Django ('python'): переживает добавление и удаление полей модели
+    data = models.JSONField("Данные заявки", encoder=DjangoJSONEncoder)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['serial_key', '-created_at'], name='archivedrequest_serial_key_idx'),
+        ]
+
     def __str__(self):
-        return f"История заявки #{self.repair_request.id} — {self.new_status} ({self.changed_at})"
\ No newline at end of file
+        return f"Архивная заявка #{self.id} ({self.serial_key})"
+
+    @classmethod
+    def from_repair_request(cls, repair_request):
+        fields = serializers.serialize('python', [repair_request])[0]['fields']
+        return cls(
+            id=repair_request.id,
+            serial_key=repair_request.serial_key,
+            status=repair_request.status,
+            product_id=repair_request.product_id,
+            package_id=repair_request.package_id,
+            created_at=repair_request.created_at,
+            data=fields,
+        )
+
+    def to_repair_request(self):
+        """Заявка из снимка — несохранённый экземпляр RepairRequest, только для чтения."""
+        record = {'model': RepairRequest._meta.label_lower, 'pk': self.id, 'fields': self.data}
+        repair_request = next(serializers.deserialize('python', [record], ignorenonexistent=True)).object
+        # Пакет мог быть удалён уже после переноса в архив
+        repair_request.package_id = self.package_id
+        return repair_request
+
+
+class ArchivedRequestHistory(models.Model):
+    """Запись истории архивной заявки: поля и id как у RequestHistory."""
+    id = models.BigIntegerField(primary_key=True)
+    repair_request = models.ForeignKey(ArchivedRepairRequest, on_delete=models.CASCADE, related_name='history',
+                                       db_index=False)
+    changed_by = models.ForeignKey('CustomUser', on_delete=models.SET_NULL, null=True)
+    old_status = models.CharField(max_length=50, blank=True, null=True, choices=RequestHistory.STATUS_CHOICES)
+    new_status = models.CharField(max_length=50, choices=RequestHistory.STATUS_CHOICES)
+    event_type = models.CharField("Тип события", max_length=20, choices=RequestHistory.EVENT_TYPE_CHOICES)
+    comment = models.TextField(blank=True, null=True)
+    changes = models.JSONField("Изменения", default=dict, blank=True)
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['repair_request', 'event_type', 'changed_at'], name='archivedhistory_event_idx'),
+        ]
+
+    def __str__(self):
+        return f"История архивной заявки #{self.repair_request_id} — {self.new_status} ({self.changed_at})"
+
+
+class ArchivedMediaFile(models.Model):
+    """Фото или видео архивной заявки: файл лежит в её zip-архиве (ArchivedRepairRequest.media_archive)."""
+    KIND_CHOICES = [
+        ('photo', 'Фото'),
+        ('video', 'Видео'),
+    ]
+
+    repair_request = models.ForeignKey(ArchivedRepairRequest, on_delete=models.CASCADE, related_name='media')
+    kind = models.CharField("Тип", max_length=10, choices=KIND_CHOICES)
+    member = models.CharField("Файл в архиве", max_length=100)
+    original_name = models.CharField("Исходный файл", max_length=255)
+    size = models.PositiveBigIntegerField("Размер файла")
+
+    def __str__(self):
+        return f"{self.get_kind_display()} архивной заявки #{self.repair_request_id}"
+
+    @property
+    def url(self):
+        return reverse('archived_media', args=[self.repair_request_id, self.id])
+
+    # Миниатюр и превью в архиве нет — шаблоны галереи получают сам файл
+    thumbnail_url = preview_url = url
@@ -0,0 +1,70 @@
+# service_track_app/pagination.py
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from django.urls import reverse
+
+PAGE_SIZES = (20, 50, 100)
+DEFAULT_PAGE_SIZE = 20
+
+
+def get_page_size(request):
+    """Размер страницы из GET-параметра page_size (только из разрешённых значений)."""
+    try:
+        page_size = int(request.GET.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+    return page_size if page_size in PAGE_SIZES else DEFAULT_PAGE_SIZE
+
+
+def encode_cursor(obj):
+    value = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Возвращает (created_at, id) последней показанной записи или None для первой страницы."""
+    if not cursor:
+        return None
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except ValueError:
+        return None
+
+
+def keyset_page(queryset, cursor, page_size):
+    """
+    Keyset-пагинация по (-created_at, -id).
+    Вместо OFFSET продолжаем с последней показанной записи, поэтому стоимость страницы
+    не зависит от её номера. Возвращает (записи страницы, курсор следующей страницы или None).
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    position = decode_cursor(cursor)
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    # Лишняя запись показывает, есть ли следующая страница
+    items = list(queryset[:page_size + 1])
+    next_cursor = encode_cursor(items[page_size - 1]) if len(items) > page_size else None
+    return items[:page_size], next_cursor
+
+
+def pagination_context(request, page_size, next_cursor, more_url_name):
+    """
+    Контекст для includes/pagination.html: переключатель размера страницы
+    и кнопка «Показать ещё», которая догружает фрагмент с endpoint more_url_name.
+    """
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    more_query = params.urlencode()
+    params.pop('page_size', None)
+    return {
+        'page_size': page_size,
+        'page_sizes': PAGE_SIZES,
+        'page_query': params.urlencode(),
+        'next_cursor': next_cursor,
+        'more_url': f"{reverse(more_url_name)}?{more_query}",
+    }
@@ -0,0 +1,194 @@
+# service_track_app/request_import.py
+import csv
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django import forms
+from django.db import models, transaction
+
+from .forms import RepairRequestForm
+from .importers import header_map, iter_records
+from .models import Product, RepairRequest, RequestHistory, normalize_serial_number
+from .search import index_repair_requests
+from .tracking import invalidate_tracking_cache
+
+INITIAL_HISTORY_COMMENT = "Товар получен от покупателя и зарегистрирован в системе (импорт из файла)"
+
+HEADER_ALIASES = {
+    'серийный номер': 'serial_number',
+    'serial': 'serial_number',
+    'model': 'product',
+    'модель': 'product',
+    'модель товара': 'product',
+    'телефон': 'customer_phone',
+    'покупатель': 'customer_name',
+    'email': 'customer_email',
+}
+
+# Сокращённые названия статусов гарантии из таблиц дилеров
+CHOICE_ALIASES = {
+    'warranty_status': {
+        'гарантия': 'warranty',
+        'платный ремонт': 'paid_repair',
+        'платный': 'paid_repair',
+        'диагностика': 'diagnostics',
+    },
+}
+
+
+class ProductNameField(forms.Field):
+    """Товар по названию (или «Бренд Название») через заранее построенный словарь, без запроса на строку."""
+
+    def __init__(self, products_by_name, **kwargs):
+        super().__init__(**kwargs)
+        self.products_by_name = products_by_name
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        product = self.products_by_name.get(' '.join(str(value).split()).lower())
+        if product is None:
+            raise forms.ValidationError(f"Товар «{value}» не найден в каталоге")
+        return product
+
+
+class RepairRequestImportForm(RepairRequestForm):
+    """Правила RepairRequestForm, но товар ищется по названию в словаре products_by_name."""
+
+    def __init__(self, *args, products_by_name, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['product'] = ProductNameField(products_by_name, label=self.fields['product'].label)
+
+    def _get_validation_exclusions(self):
+        # Товар уже взят из словаря активного каталога — проверка ForeignKey в full_clean дала бы запрос на строку
+        exclude = super()._get_validation_exclusions()
+        exclude.add('product')
+        return exclude
+
+
+def build_products_by_name():
+    """Словарь «название → товар» по активному каталогу: и по названию, и по «Бренд Название». Один запрос."""
+    products_by_name = {}
+    for product in Product.objects.filter(is_active=True).only('id', 'name', 'brand'):
+        products_by_name.setdefault(' '.join(str(product).split()).lower(), product)
+        products_by_name[' '.join(product.name.split()).lower()] = product
+    return products_by_name
+
+
+def iter_jsonl(f):
+    """Объекты из JSON Lines; для строк, которые не разобрать, отдаёт ValueError вместо dict."""
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"Некорректный JSON: {e}")
+            continue
+        yield record if isinstance(record, dict) else ValueError("Строка должна быть JSON-объектом")
+
+
+def iter_request_records(f, filename):
+    if filename.lower().endswith('.jsonl'):
+        return iter_jsonl(f)
+    return iter_records(f, filename)
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    rejects: list = field(default_factory=list)  # [(номер записи, ошибки, исходная запись)]
+
+    def write_rejects_csv(self, f):
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(['record', 'errors', 'data'])
+        for number, errors, record in self.rejects:
+            writer.writerow([number, errors, json.dumps(record, ensure_ascii=False, default=str)])
+
+
+class _ImportRollback(Exception):
+    pass
+
+
+def _form_data(record, headers):
+    """Запись файла -> данные формы: заголовки по имени/verbose_name полей, даты ДД.ММ.ГГГГ, choices по названию."""
+    data = {}
+    for key, value in record.items():
+        field_name = headers.get(str(key).strip().lower())
+        if field_name is None:
+            continue
+        value = '' if value is None else str(value).strip()
+        model_field = RepairRequest._meta.get_field(field_name)
+        if isinstance(model_field, models.DateField) and value:
+            try:
+                value = datetime.strptime(value, '%d.%m.%Y').date().isoformat()
+            except ValueError:
+                pass
+        elif model_field.choices and value:
+            labels = {str(label).lower(): code for code, label in model_field.choices}
+            labels.update(CHOICE_ALIASES.get(field_name, {}))
+            value = labels.get(value.lower(), value)
+        data[field_name] = value
+    return data
+
+
+def import_repair_requests(user, f, filename, dry_run=False):
+    """
+    Импорт заявок из CSV / JSON / JSONL от имени дилера user.
+    Каждая запись проверяется правилами RepairRequestForm; корректные записываются bulk_create
+    вместе с начальными записями RequestHistory в одной транзакции, остальные попадают в rejects.
+    """
+    headers = header_map(RepairRequest, HEADER_ALIASES)
+    products_by_name = build_products_by_name()
+    result = ImportResult()
+    repair_requests = []
+
+    for number, record in enumerate(iter_request_records(f, filename), start=1):
+        if isinstance(record, Exception):
+            result.rejects.append((number, str(record), {}))
+            continue
+
+        form = RepairRequestImportForm(data=_form_data(record, headers), products_by_name=products_by_name)
+        if not form.is_valid():
+            errors = '; '.join(f"{form.fields[name].label if name in form.fields else name}: {' '.join(messages)}"
+                               for name, messages in form.errors.items())
+            result.rejects.append((number, errors, record))
+            continue
+
+        repair_request = form.save(commit=False)
+        repair_request.created_by = user
+        repair_request.dealer_company = user.dealer_company
+        # bulk_create не вызывает save() — ключ серийного номера заполняем сами
+        repair_request.serial_key = normalize_serial_number(repair_request.serial_number)
+        repair_requests.append(repair_request)
+
+    try:
+        with transaction.atomic():
+            RepairRequest.objects.bulk_create(repair_requests, batch_size=500)
+            RequestHistory.objects.bulk_create([
+                RequestHistory(
+                    repair_request=repair_request,
+                    changed_by=user,
+                    new_status='accepted_by_dealer',
+                    comment=INITIAL_HISTORY_COMMENT,
+                )
+                for repair_request in repair_requests
+            ], batch_size=500)
+            # bulk_create не вызывает post_save — строки поискового индекса добавляем сами
+            index_repair_requests(repair_requests)
+            if dry_run:
+                raise _ImportRollback
+            # Сигналы post_save при bulk_create не срабатывают — сбрасываем кэш отслеживания сами
+            serial_keys = {repair_request.serial_key for repair_request in repair_requests}
+
+            def invalidate_tracking():
+                for serial_key in serial_keys:
+                    invalidate_tracking_cache(serial_key)
+            transaction.on_commit(invalidate_tracking)
+    except _ImportRollback:
+        pass
+
+    result.created = len(repair_requests)
+    return result
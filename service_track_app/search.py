@@ -0,0 +1,225 @@
+# service_track_app/search.py
+"""
+Полнотекстовый поиск по заявкам.
+
+Индекс — отдельная таблица со строкой на заявку: на SQLite это виртуальная таблица FTS5,
+на PostgreSQL — колонка tsvector с GIN-индексом (таблицы создаёт миграция 0026).
+Индекс обновляется при сохранении заявки и товара (signals.py), после массового импорта
+и командой rebuild_search_index. На других СУБД поиск идёт через icontains без индекса.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .catalog import get_products
+from .models import RepairRequest
+
+SEARCH_TABLE = 'service_track_app_repairrequest_search'
+
+# (колонка индекса, вес): A — серийный номер и телефон, B — покупатель и товар, C — описания неисправности
+SEARCH_COLUMNS = [
+    ('serial', 'A'),
+    ('phone', 'A'),
+    ('customer', 'B'),
+    ('product', 'B'),
+    ('problem', 'C'),
+    ('detected', 'C'),
+    ('malfunction', 'C'),
+]
+BM25_WEIGHTS = {'A': 10.0, 'B': 4.0, 'C': 1.0}
+
+# Конфигурация PostgreSQL для текстов (со стеммингом); серийные номера и телефоны — 'simple'
+SEARCH_CONFIG = 'russian'
+SIMPLE_COLUMNS = {'serial', 'phone'}
+
+# Поля заявки, из которых собирается документ индекса
+DOCUMENT_FIELDS = [
+    'id', 'serial_number', 'serial_key', 'customer_name', 'customer_phone', 'product_id',
+    'problem_description', 'detected_problem', 'malfunction_formulation',
+]
+# Для поиска без индекса (СУБД без FTS)
+FALLBACK_FIELDS = [
+    'serial_number', 'customer_name', 'customer_phone', 'problem_description', 'detected_problem',
+    'malfunction_formulation', 'product__name', 'product__brand',
+]
+
+MAX_QUERY_TOKENS = 8
+INDEX_BATCH_SIZE = 500
+
+
+def search_backend():
+    """'fts5', 'tsvector' или None, если у СУБД нет полнотекстового индекса."""
+    return {'sqlite': 'fts5', 'postgresql': 'tsvector'}.get(connection.vendor)
+
+
+def phone_digits(value):
+    return re.sub(r'\D', '', str(value or ''))
+
+
+def search_document(repair_request, product):
+    """Текст колонок индекса для заявки: {колонка: текст}."""
+    return {
+        'serial': ' '.join(filter(None, [repair_request.serial_number, repair_request.serial_key])),
+        # Телефон хранится в E.164 (+79991234567) — в индекс только цифры
+        'phone': phone_digits(repair_request.customer_phone),
+        'customer': repair_request.customer_name or '',
+        'product': ' '.join(filter(None, [product.brand, product.series, product.name])) if product else '',
+        'problem': repair_request.problem_description or '',
+        'detected': repair_request.detected_problem or '',
+        'malfunction': repair_request.malfunction_formulation or '',
+    }
+
+
+def query_groups(query):
+    """
+    Слова запроса для поиска по префиксу: список групп, в каждой — варианты слова (совпасть должен любой).
+    Запрос из одних цифр длиной от 10 знаков дополнительно ищется как телефон: 8 999 ... и 999 ... -> 7999...
+    """
+    query = query or ''
+    if not re.search(r'[^\W\d_]', query):
+        digits = phone_digits(query)
+        if len(digits) >= 10:
+            variants = [digits]
+            if len(digits) == 11 and digits[0] == '8':
+                variants.append('7' + digits[1:])
+            elif len(digits) == 10:
+                variants.append('7' + digits)
+            return [variants]
+    return [[token] for token in re.findall(r'\w+', query.lower())[:MAX_QUERY_TOKENS]]
+
+
+def _batches(items, size=INDEX_BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _document_sql():
+    # setweight(to_tsvector(...), 'A') || ... — по колонкам SEARCH_COLUMNS, значения параметрами
+    return ' || '.join(
+        f"setweight(to_tsvector('{'simple' if column in SIMPLE_COLUMNS else SEARCH_CONFIG}', %s), '{weight}')"
+        for column, weight in SEARCH_COLUMNS
+    )
+
+
+def remove_from_search_index(repair_request_ids):
+    backend = search_backend()
+    if backend is None:
+        return
+    key = 'rowid' if backend == 'fts5' else 'repair_request_id'
+    with connection.cursor() as cursor:
+        for batch in _batches(repair_request_ids):
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE {key} IN ({', '.join(['%s'] * len(batch))})", batch
+            )
+
+
+def index_repair_requests(repair_requests):
+    """
+    Пересобирает строки индекса для заявок (экземпляры с полями DOCUMENT_FIELDS).
+    Товары берутся из кэша каталога, поэтому запросы к БД — только запись в индекс.
+    """
+    backend = search_backend()
+    if backend is None:
+        return
+
+    columns = [column for column, _ in SEARCH_COLUMNS]
+    for batch in _batches(repair_requests):
+        products = get_products({repair_request.product_id for repair_request in batch})
+        rows = []
+        for repair_request in batch:
+            document = search_document(repair_request, products.get(repair_request.product_id))
+            rows.append([repair_request.id] + [document[column] for column in columns])
+
+        remove_from_search_index([row[0] for row in rows])
+        with connection.cursor() as cursor:
+            if backend == 'fts5':
+                cursor.executemany(
+                    f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(columns)}) "
+                    f"VALUES ({', '.join(['%s'] * (len(columns) + 1))})",
+                    rows,
+                )
+            else:
+                cursor.executemany(
+                    f"INSERT INTO {SEARCH_TABLE} (repair_request_id, document) VALUES (%s, {_document_sql()})",
+                    rows,
+                )
+
+
+def rebuild_search_index(batch_size=INDEX_BATCH_SIZE):
+    """Индекс заново по всем заявкам. Возвращает число проиндексированных заявок."""
+    if search_backend() is None:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+    count = 0
+    batch = []
+    for repair_request in RepairRequest.objects.only(*DOCUMENT_FIELDS).order_by('id').iterator(chunk_size=batch_size):
+        batch.append(repair_request)
+        if len(batch) >= batch_size:
+            index_repair_requests(batch)
+            count += len(batch)
+            batch = []
+    index_repair_requests(batch)
+    return count + len(batch)
+
+
+def search_request_ids(query, created_by=None, limit=20, offset=0):
+    """
+    id заявок по запросу, лучшие совпадения первыми (при равной релевантности — новые).
+    created_by — только заявки этого пользователя (для дилеров).
+    """
+    groups = query_groups(query)
+    if not groups:
+        return []
+
+    backend = search_backend()
+    if backend is None:
+        return _fallback_search_ids(groups, created_by, limit, offset)
+
+    requests_table = RepairRequest._meta.db_table
+    if backend == 'fts5':
+        match = ' AND '.join('(' + ' OR '.join(f'"{token}"*' for token in group) + ')' for group in groups)
+        weights = ', '.join(str(BM25_WEIGHTS[weight]) for _, weight in SEARCH_COLUMNS)
+        key, condition, rank = (
+            f'{SEARCH_TABLE}.rowid', f'{SEARCH_TABLE} MATCH %s', f'bm25({SEARCH_TABLE}, {weights})'
+        )
+        params = [match]
+    else:
+        tsquery = ' & '.join('(' + ' | '.join(f'{token}:*' for token in group) + ')' for group in groups)
+        key, condition, rank = (
+            f'{SEARCH_TABLE}.repair_request_id', f'{SEARCH_TABLE}.document @@ to_tsquery(%s, %s)',
+            f'-ts_rank_cd({SEARCH_TABLE}.document, to_tsquery(%s, %s))'
+        )
+        params = [SEARCH_CONFIG, tsquery]
+
+    sql = f"SELECT {key} FROM {SEARCH_TABLE}"
+    if created_by is not None:
+        sql += f" JOIN {requests_table} ON {requests_table}.id = {key}"
+    sql += f" WHERE {condition}"
+    if created_by is not None:
+        sql += f" AND {requests_table}.created_by_id = %s"
+        params.append(created_by.pk)
+    sql += f" ORDER BY {rank}, {key} DESC LIMIT %s OFFSET %s"
+    if backend == 'tsvector':
+        params += [SEARCH_CONFIG, tsquery]
+    params += [limit, offset]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_search_ids(groups, created_by, limit, offset):
+    repair_requests = RepairRequest.objects.all()
+    if created_by is not None:
+        repair_requests = repair_requests.filter(created_by=created_by)
+    for group in groups:
+        condition = Q()
+        for token in group:
+            for field in FALLBACK_FIELDS:
+                condition |= Q(**{f'{field}__icontains': token})
+        repair_requests = repair_requests.filter(condition)
+    return list(repair_requests.order_by('-created_at', '-id').values_list('id', flat=True)[offset:offset + limit])
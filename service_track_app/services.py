@@ -0,0 +1,235 @@
+# service_track_app/services.py
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .forms import RepairRequestAutosaveForm
+from .models import ArchivedRepairRequest, RepairRequest, Package, RequestHistory
+from .tracking import invalidate_tracking_cache
+
+# Статусы, из которых дилер может отправить заявку в сервисный центр
+SENDABLE_STATUSES = ('accepted_by_dealer', 'waiting')
+
+
+PACKAGE_COUNTER_FIELDS = [
+    'requests_total', 'requests_accepted', 'requests_closed', 'requests_rejected', 'requests_with_photos',
+]
+
+
+def count_package_requests(package_ids):
+    """Фактические значения счётчиков по данным заявок: {id пакета: {поле: значение}}."""
+    package_ids = [package_id for package_id in set(package_ids) if package_id is not None]
+    counters = {package_id: dict.fromkeys(PACKAGE_COUNTER_FIELDS, 0) for package_id in package_ids}
+    rows = (
+        RepairRequest.objects.filter(package_id__in=package_ids)
+        .values('package_id')
+        .annotate(
+            # JOIN с фото размножает строки, поэтому везде distinct
+            requests_total=Count('id', distinct=True),
+            requests_accepted=Count('id', distinct=True, filter=Q(status='accepted_by_dealer')),
+            requests_closed=Count('id', distinct=True, filter=Q(status='closed')),
+            requests_rejected=Count('id', distinct=True, filter=Q(status='rejected')),
+            requests_with_photos=Count('id', distinct=True, filter=Q(photos__isnull=False)),
+        )
+        .order_by()
+    )
+    for row in rows:
+        counters[row.pop('package_id')] = row
+
+    # Заявки, перенесённые в архив (archive.py), остаются в счётчиках своего пакета
+    archived_rows = (
+        ArchivedRepairRequest.objects.filter(package_id__in=package_ids)
+        .values('package_id')
+        .annotate(
+            requests_total=Count('id', distinct=True),
+            requests_closed=Count('id', distinct=True, filter=Q(status='closed')),
+            requests_rejected=Count('id', distinct=True, filter=Q(status='rejected')),
+            requests_with_photos=Count('id', distinct=True, filter=Q(media__kind='photo')),
+        )
+        .order_by()
+    )
+    for row in archived_rows:
+        package_counters = counters[row.pop('package_id')]
+        for name, value in row.items():
+            package_counters[name] += value
+    return counters
+
+
+def refresh_package_counters(package_ids):
+    """Пересчитывает счётчики пакетов: один агрегирующий SELECT и один bulk_update."""
+    counters = count_package_requests(package_ids)
+    if counters:
+        Package.objects.bulk_update(
+            [Package(id=package_id, **values) for package_id, values in counters.items()],
+            PACKAGE_COUNTER_FIELDS
+        )
+
+
+def _invalidate_on_commit(serial_keys):
+    # bulk-операции не вызывают сигналы, поэтому кэш отслеживания сбрасываем явно
+    serial_keys = set(serial_keys)
+    transaction.on_commit(lambda: [invalidate_tracking_cache(key) for key in serial_keys])
+
+
+def send_requests_to_service(user, request_ids):
+    """
+    Отправка выбранных заявок в сервисный центр одним пакетом.
+    Всё выполняется в одной транзакции за постоянное число запросов:
+    блокировка строк, создание пакета, одно UPDATE заявок и один INSERT истории.
+    Возвращает (package, sent_ids); package = None, если отправлять нечего.
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        requests_qs = RepairRequest.objects.select_for_update().filter(
+            id__in=request_ids,
+            status__in=SENDABLE_STATUSES,
+        )
+        # Дилер может отправлять только свои заявки
+        if user.role == 'dealer':
+            requests_qs = requests_qs.filter(created_by=user)
+
+        rows = list(requests_qs.values_list('id', 'status', 'serial_key', 'package_id'))
+        if not rows:
+            return None, []
+
+        package = Package.objects.create(
+            created_by=user,
+            dealer_company=user.dealer_company
+        )
+
+        sent_ids = [request_id for request_id, _, _, _ in rows]
+        # Значения одинаковые для всех строк, поэтому хватает одного UPDATE
+        RepairRequest.objects.filter(id__in=sent_ids).update(
+            status='sent_to_service',
+            sent_at=now,
+            package=package,
+            version=F('version') + 1
+        )
+
+        RequestHistory.objects.bulk_create([
+            RequestHistory(
+                repair_request_id=request_id,
+                changed_by=user,
+                old_status=old_status,
+                new_status='sent_to_service',
+                comment="Отправлено в сервисный центр"
+            )
+            for request_id, old_status, _, _ in rows
+        ])
+
+        # Счётчики нового пакета и пакетов, из которых заявки ушли
+        refresh_package_counters([package.id] + [package_id for _, _, _, package_id in rows])
+        _invalidate_on_commit(serial_key for _, _, serial_key, _ in rows)
+
+    return package, sent_ids
+
+
+def accept_package_requests(user, package_id, selected_ids):
+    """
+    Приёмка пакета в сервисном центре одной транзакцией.
+    Пакет принимается только целиком: если выбраны не все заявки, ничего не меняется.
+    Возвращает (all_selected, results), где results — {id заявки: результат}:
+    'accepted', 'already_accepted', 'not_selected' или 'not_in_package'.
+    """
+    selected = {int(i) for i in selected_ids if str(i).isdigit()}
+
+    with transaction.atomic():
+        package = Package.objects.select_for_update().get(id=package_id)
+        rows = list(
+            RepairRequest.objects.select_for_update()
+            .filter(package=package)
+            .values_list('id', 'status', 'serial_key')
+        )
+        package_ids = {request_id for request_id, _, _ in rows}
+
+        results = {request_id: 'not_in_package' for request_id in selected - package_ids}
+        results.update({request_id: 'not_selected' for request_id in package_ids - selected})
+        all_selected = bool(rows) and selected == package_ids
+        if not all_selected:
+            return False, results
+
+        to_accept = [(request_id, status, serial_key) for request_id, status, serial_key in rows
+                     if status != 'accepted_by_dealer']
+        for request_id, status, _ in rows:
+            results[request_id] = 'accepted' if status != 'accepted_by_dealer' else 'already_accepted'
+
+        if to_accept:
+            RepairRequest.objects.filter(id__in=[r[0] for r in to_accept]).update(
+                status='accepted_by_dealer', version=F('version') + 1
+            )
+            RequestHistory.objects.bulk_create([
+                RequestHistory(
+                    repair_request_id=request_id,
+                    changed_by=user,
+                    old_status=old_status,
+                    new_status='accepted_by_dealer',
+                    comment='Заявка принята в сервисном центре'
+                )
+                for request_id, old_status, _ in to_accept
+            ])
+            _invalidate_on_commit(serial_key for _, _, serial_key in to_accept)
+
+            refresh_package_counters([package.id])
+
+        if package.status != 'accepted':
+            package.status = 'accepted'
+            package.save(update_fields=['status'])
+
+    return True, results
+
+
+# Поля, которые можно менять автосохранением, — те же, что в форме редактирования заявки
+AUTOSAVE_FIELDS = RepairRequestAutosaveForm.Meta.fields
+
+
+class StaleVersionError(Exception):
+    """Заявку уже изменили после того, как клиент её загрузил."""
+
+    def __init__(self, repair_request):
+        super().__init__(f"Заявка #{repair_request.id} изменена (версия {repair_request.version})")
+        self.repair_request = repair_request
+
+
+def save_request_changes(repair_request, version, changes, user=None):
+    """
+    Применяет пачку изменений полей заявки {поле: значение из формы} для автосохранения.
+    Значения проверяются полями RepairRequestAutosaveForm; сохраняются только изменившиеся поля
+    (save(update_fields=...)). version — версия, которую видел клиент: если заявку успели изменить,
+    бросается StaleVersionError, ошибки значений — ValidationError по полям. user попадает в историю изменений.
+    Возвращает список сохранённых полей.
+    """
+    unknown = [name for name in changes if name not in AUTOSAVE_FIELDS]
+    if unknown:
+        raise ValidationError({name: "Поле нельзя изменять" for name in unknown})
+    if repair_request.version != version:
+        raise StaleVersionError(repair_request)
+
+    form_fields = RepairRequestAutosaveForm(instance=repair_request).fields
+    errors = {}
+    changed = []
+    for name, value in changes.items():
+        try:
+            cleaned = form_fields[name].clean(value)
+        except ValidationError as e:
+            errors[name] = e.messages
+            continue
+        model_field = RepairRequest._meta.get_field(name)
+        before = model_field.value_from_object(repair_request)
+        model_field.save_form_data(repair_request, cleaned)
+        if model_field.value_from_object(repair_request) != before:
+            changed.append(name)
+    if errors:
+        raise ValidationError(errors)
+    if not changed:
+        return []
+
+    with transaction.atomic():
+        # Условный UPDATE занимает строку: из двух одновременных правок одной версии пройдёт одна
+        if not RepairRequest.objects.filter(id=repair_request.id, version=version).update(version=F('version') + 1):
+            raise StaleVersionError(RepairRequest.objects.get(id=repair_request.id))
+        # save() поднимет версию в памяти до той же version + 1 и запишет историю
+        repair_request.history_user = user
+        repair_request.save(update_fields=changed)
+    return changed
@@ -0,0 +1,138 @@
+# service_track_app/signals.py
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from .catalog import index_products, invalidate_product_catalog
+from .models import (MEDIA_FILE_FIELDS, MediaBlob, Product, RepairRequest, RepairRequestPhoto, RepairRequestVideo,
+                     RequestHistory)
+from .search import DOCUMENT_FIELDS, index_repair_requests, remove_from_search_index
+from .services import refresh_package_counters
+from .tracking import invalidate_tracking_cache
+
+
+def _refresh_counters_on_commit(package_ids):
+    package_ids = {package_id for package_id in package_ids if package_id is not None}
+    if package_ids:
+        transaction.on_commit(lambda: refresh_package_counters(package_ids))
+
+
+def _invalidate_tracking_on_commit(serial_keys):
+    # Версию кэша меняем после коммита: иначе параллельный поиск успеет закэшировать под новой версией
+    # ещё не закоммиченное состояние, и оно будет отдаваться до TRACKING_CACHE_TIMEOUT
+    serial_keys = {serial_key for serial_key in serial_keys if serial_key}
+    if serial_keys:
+        transaction.on_commit(lambda: [invalidate_tracking_cache(serial_key) for serial_key in serial_keys])
+
+
+def _cascaded_from_request(origin):
+    # origin — что удаляли изначально (экземпляр или QuerySet); при удалении заявки кэши и счётчики
+    # уже обновляет repair_request_deleted, а обращение к instance.repair_request стоило бы запроса на строку
+    return getattr(origin, 'model', type(origin)) is RepairRequest
+
+
+@receiver(post_save, sender=RepairRequest)
+def repair_request_saved(sender, instance, created, **kwargs):
+    # Прежние значения запомнены при загрузке (ChangeTrackingMixin) и обновятся после save()
+    initial_serial_key = instance.initial_value('serial_key')
+    initial_package_id = instance.initial_value('package')
+    serial_changed = initial_serial_key != instance.serial_key
+    status_changed = instance.initial_value('status') != instance.status
+    package_changed = initial_package_id != instance.package_id
+
+    if created or serial_changed or status_changed:
+        _invalidate_tracking_on_commit([instance.serial_key, initial_serial_key if serial_changed else None])
+
+    if status_changed or package_changed:
+        _refresh_counters_on_commit([instance.package_id, initial_package_id])
+
+    # Строка полнотекстового индекса — в той же транзакции, что и заявка
+    index_repair_requests([instance])
+
+
+@receiver(post_delete, sender=RepairRequest)
+def repair_request_deleted(sender, instance, **kwargs):
+    _invalidate_tracking_on_commit([instance.serial_key])
+    _refresh_counters_on_commit([instance.package_id])
+    remove_from_search_index([instance.id])
+
+
+@receiver(post_save, sender=RepairRequestPhoto)
+@receiver(post_delete, sender=RepairRequestPhoto)
+def repair_request_photo_changed(sender, instance, origin=None, **kwargs):
+    if kwargs.get('created') is False or _cascaded_from_request(origin):
+        # Правка существующего фото не меняет «заявок с фото»
+        return
+    try:
+        package_id = instance.repair_request.package_id
+    except RepairRequest.DoesNotExist:
+        # Заявка удалена каскадом — счётчики уже пересчитаны в repair_request_deleted
+        return
+    _refresh_counters_on_commit([package_id])
+
+
+@receiver(post_save, sender=RequestHistory)
+@receiver(post_delete, sender=RequestHistory)
+def request_history_changed(sender, instance, origin=None, **kwargs):
+    if _cascaded_from_request(origin):
+        return
+    try:
+        serial_key = instance.repair_request.serial_key
+    except RepairRequest.DoesNotExist:
+        # Заявка удалена каскадом — кэш уже сброшен в repair_request_deleted
+        return
+    _invalidate_tracking_on_commit([serial_key])
+
+
+def _file_names(instance):
+    names = {}
+    for field_name in MEDIA_FILE_FIELDS[type(instance)]:
+        value = instance.__dict__.get(field_name)
+        names[field_name] = getattr(value, 'name', value) or ''
+    return names
+
+
+@receiver(post_init, sender=RepairRequestPhoto)
+@receiver(post_init, sender=RepairRequestVideo)
+def remember_media_files(sender, instance, **kwargs):
+    instance._initial_files = _file_names(instance)
+
+
+@receiver(post_save, sender=RepairRequestPhoto)
+@receiver(post_save, sender=RepairRequestVideo)
+def media_files_saved(sender, instance, **kwargs):
+    # Ссылки на файлы в хранилище с адресацией по содержимому: новый файл — +1, заменённый — −1
+    current = _file_names(instance)
+    for field_name, name in current.items():
+        old_name = instance._initial_files.get(field_name, '')
+        if name == old_name:
+            continue
+        if name:
+            MediaBlob.acquire(name)
+        if old_name:
+            MediaBlob.release(old_name)
+    instance._initial_files = current
+
+
+@receiver(post_delete, sender=RepairRequestPhoto)
+@receiver(post_delete, sender=RepairRequestVideo)
+def media_files_deleted(sender, instance, **kwargs):
+    for name in _file_names(instance).values():
+        if name:
+            MediaBlob.release(name)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    # Слова для автодополнения; при удалении товара они удаляются каскадом
+    index_products([instance])
+    transaction.on_commit(invalidate_product_catalog)
+    # Название товара есть в индексе поиска заявок — пересобираем после сброса кэша каталога
+    transaction.on_commit(lambda: index_repair_requests(
+        RepairRequest.objects.filter(product_id=instance.id).only(*DOCUMENT_FIELDS)
+    ))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_product_catalog)
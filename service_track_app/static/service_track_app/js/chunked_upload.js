@@ -0,0 +1,112 @@
+// Поблочная загрузка видео с возобновлением после обрыва связи.
+// Токен незаконченной загрузки хранится в localStorage, поэтому после перезагрузки страницы
+// тот же файл докачивается с места остановки.
+
+const CHUNK_RETRIES = 5;
+
+function getCsrfToken() {
+    const input = document.querySelector('input[name="csrfmiddlewaretoken"]');
+    return input ? input.value : '';
+}
+
+function uploadStorageKey(file) {
+    return `video-upload:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+async function startVideoUpload(startUrl, file) {
+    const body = new FormData();
+    body.append('filename', file.name);
+    body.append('size', file.size);
+
+    const response = await fetch(startUrl, {
+        method: 'POST',
+        headers: {'X-CSRFToken': getCsrfToken()},
+        body: body,
+    });
+    const data = await response.json();
+    if (!data.success) {
+        throw new Error(data.error);
+    }
+    return data;
+}
+
+async function getUploadStatus(chunkUrl) {
+    const response = await fetch(chunkUrl);
+    if (!response.ok) {
+        return null;
+    }
+    return response.json();
+}
+
+async function sendChunk(chunkUrl, file, offset, chunkSize) {
+    const chunk = file.slice(offset, offset + chunkSize);
+    const response = await fetch(chunkUrl, {
+        method: 'PUT',
+        headers: {
+            'X-CSRFToken': getCsrfToken(),
+            'X-Upload-Offset': offset,
+            'Content-Type': 'application/octet-stream',
+        },
+        body: chunk,
+    });
+    const data = await response.json();
+    if (response.status === 409) {
+        // Сервер уже получил больше (или меньше) — продолжаем с его смещения
+        return data.offset;
+    }
+    if (!data.success) {
+        const error = new Error(data.error);
+        // Ошибки проверки (формат, размер) повторять бессмысленно, в отличие от сбоев сети и сервера
+        error.fatal = response.status >= 400 && response.status < 500;
+        throw error;
+    }
+    return data.offset;
+}
+
+// Загружает файл и возвращает токен, по которому он прикрепляется к заявке
+async function uploadVideoChunked(file, {startUrl, chunkUrlTemplate, onProgress}) {
+    const storageKey = uploadStorageKey(file);
+    let token = localStorage.getItem(storageKey);
+    let offset = 0;
+    let chunkSize = 5 * 1024 * 1024;
+
+    if (token) {
+        const status = await getUploadStatus(chunkUrlTemplate.replace('TOKEN', token));
+        if (status && status.status !== 'attached') {
+            offset = status.offset;
+        } else {
+            token = null;
+        }
+    }
+    if (!token) {
+        const started = await startVideoUpload(startUrl, file);
+        token = started.token;
+        chunkSize = started.chunk_size;
+        localStorage.setItem(storageKey, token);
+    }
+
+    const chunkUrl = chunkUrlTemplate.replace('TOKEN', token);
+    let retries = 0;
+    while (offset < file.size) {
+        try {
+            offset = await sendChunk(chunkUrl, file, offset, chunkSize);
+            retries = 0;
+            if (onProgress) {
+                onProgress(offset / file.size);
+            }
+        } catch (error) {
+            if (error.fatal || ++retries > CHUNK_RETRIES) {
+                throw error;
+            }
+            // Обрыв связи: ждём и спрашиваем у сервера, сколько он успел получить
+            await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+            const status = await getUploadStatus(chunkUrl).catch(() => null);
+            if (status) {
+                offset = status.offset;
+            }
+        }
+    }
+
+    localStorage.removeItem(storageKey);
+    return token;
+}
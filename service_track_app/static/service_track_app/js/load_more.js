@@ -0,0 +1,31 @@
+// Кнопка «Показать ещё»: догружает следующую страницу (keyset-курсор) и дописывает её в контейнер
+document.addEventListener('click', async function (event) {
+    const button = event.target.closest('.load-more-btn');
+    if (!button) {
+        return;
+    }
+
+    button.disabled = true;
+    const url = new URL(button.dataset.url, window.location.origin);
+    url.searchParams.set('cursor', button.dataset.cursor);
+
+    try {
+        const response = await fetch(url, {headers: {'X-Requested-With': 'XMLHttpRequest'}});
+        if (!response.ok) {
+            throw new Error(response.statusText);
+        }
+        const html = await response.text();
+        document.getElementById(button.dataset.target).insertAdjacentHTML('beforeend', html);
+
+        const nextCursor = response.headers.get('X-Next-Cursor');
+        if (nextCursor) {
+            button.dataset.cursor = nextCursor;
+            button.disabled = false;
+        } else {
+            button.remove();
+        }
+    } catch (error) {
+        console.error('Не удалось загрузить следующую страницу:', error);
+        button.disabled = false;
+    }
+});
@@ -0,0 +1,24 @@
+// Выбор товара с подгрузкой вариантов с сервера: в HTML формы приходит только выбранный товар,
+// остальные select2 запрашивает у product_autocomplete постранично по мере ввода и прокрутки.
+
+function initProductAutocomplete(selector) {
+    $(selector).each(function () {
+        $(this).select2({
+            placeholder: 'Выберите товар...',
+            allowClear: true,
+            width: '100%',
+            ajax: {
+                url: this.dataset.autocompleteUrl,
+                dataType: 'json',
+                delay: 250,
+                cache: true,
+                data: params => ({q: params.term || '', page: params.page || 1}),
+            },
+        });
+        // select2 сообщает о выборе только через jQuery — дублируем нативным событием
+        // для обработчиков, подписанных через addEventListener (например, отслеживание изменений формы)
+        $(this).on('select2:select select2:clear', function () {
+            this.dispatchEvent(new Event('change', {bubbles: true}));
+        });
+    });
+}
@@ -0,0 +1,55 @@
+# service_track_app/storage.py
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+
+def content_name(directory, digest, extension):
+    """Имя файла по хэшу содержимого: <каталог>/<2 символа хэша>/<хэш>.<расширение>."""
+    return posixpath.join(directory, digest[:2], f"{digest}{extension.lower()}")
+
+
+def file_digest(content):
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище медиа с адресацией по содержимому: имя файла — SHA-256 его содержимого.
+    Одинаковые файлы хранятся один раз; число ссылок на файл ведёт MediaBlob.
+    save() вызывается внутри транзакции сохранения фото/видео, чтобы блокировка MediaBlob держалась до acquire().
+    """
+
+    def __init__(self, **kwargs):
+        # Одно имя = одно содержимое, поэтому перезапись при гонке двух одинаковых загрузок безопасна
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = content_name(posixpath.dirname(name), file_digest(content), os.path.splitext(name)[1])
+        from .models import MediaBlob
+        with transaction.atomic():
+            # Решение «файл уже есть» — под блокировкой строки MediaBlob: файл без ссылок (ref_count=0)
+            # может удаляться прямо сейчас, поэтому он записывается заново
+            if MediaBlob.lock(name).ref_count and self.exists(name):
+                return name
+            return super().save(name, content, max_length=max_length)
+
+
+media_storage = ContentAddressedStorage()
+
+
+def select_media_storage():
+    return media_storage
@@ -1,3 +1,244 @@
-from django.test import TestCase
+import datetime
+import json
+from decimal import Decimal
+from itertools import product
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .act_rules import CONCLUSIONS, DECISIONS, REFUSAL_REASONS, generate_act_text
+from .models import CustomUser, Product, RepairRequest, RequestHistory
+from .tracking import RESULT_KEY, _get_version, get_tracking_result
+
+
+class UpdateRequestFieldTests(TestCase):
+    """Автосохранение полей заявки: PATCH /api/request/<id>/update/ (views.update_request_field)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.service_user = CustomUser.objects.create_user('sc', password='pw', role='service_center')
+        cls.dealer = CustomUser.objects.create_user('dealer', password='pw', role='dealer')
+        cls.product = Product.objects.create(name='Test Sub')
+
+    def setUp(self):
+        self.repair_request = RepairRequest.objects.create(
+            serial_number='SN-1',
+            product=self.product,
+            purchase_date=datetime.date(2026, 1, 15),
+            warranty_status='warranty',
+            problem_description='Не включается',
+            customer_name='Иванов',
+            created_by=self.dealer,
+        )
+        self.url = reverse('update_request_field', args=[self.repair_request.id])
+        self.client.force_login(self.service_user)
+
+    def patch(self, changes, version=None, client=None):
+        if version is None:
+            version = self.repair_request.version
+        return (client or self.client).patch(
+            self.url, json.dumps({'version': version, 'changes': changes}), content_type='application/json'
+        )
+
+    def test_saves_changes_and_bumps_version(self):
+        response = self.patch({'serial_number': 'SN-2', 'problem_description': 'Хрипит'})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(sorted(data['saved']), ['problem_description', 'serial_number'])
+        self.repair_request.refresh_from_db()
+        self.assertEqual(self.repair_request.serial_number, 'SN-2')
+        self.assertEqual(data['version'], self.repair_request.version)
+        history = RequestHistory.objects.get(repair_request=self.repair_request, event_type='edit')
+        self.assertEqual(history.changed_by, self.service_user)
+        self.assertEqual(history.changes['serial_number'], ['SN-1', 'SN-2'])
+
+    def test_customer_name_is_editable_inline(self):
+        response = self.patch({'customer_name': 'Bob'})
+
+        self.assertEqual(response.status_code, 200)
+        self.repair_request.refresh_from_db()
+        self.assertEqual(self.repair_request.customer_name, 'Bob')
+
+    def test_stale_version_returns_current_values(self):
+        version = self.repair_request.version
+        self.assertEqual(self.patch({'serial_number': 'SN-2'}).status_code, 200)
+
+        response = self.patch({'serial_number': 'SN-3'}, version=version)
+
+        self.assertEqual(response.status_code, 409)
+        data = response.json()
+        self.assertEqual(data['values'], {'serial_number': 'SN-2'})
+        self.assertEqual(data['version'], version + 1)
+        self.repair_request.refresh_from_db()
+        self.assertEqual(self.repair_request.serial_number, 'SN-2')
+
+    def test_fields_outside_whitelist_are_rejected(self):
+        response = self.patch({'serial_number': 'SN-2', 'created_by': self.service_user.id, 'version': 100})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'created_by', 'version'})
+        self.repair_request.refresh_from_db()
+        self.assertEqual(self.repair_request.serial_number, 'SN-1')
+        self.assertEqual(self.repair_request.created_by, self.dealer)
+
+    def test_invalid_values_return_per_field_errors(self):
+        version = self.repair_request.version
+        response = self.patch({'purchase_date': 'не дата', 'warranty_status': 'unknown', 'serial_number': 'SN-2'})
+
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertEqual(set(data['errors']), {'purchase_date', 'warranty_status'})
+        # Пачка не сохраняется целиком; клиент получает значения из БД, чтобы вернуть их в ячейки
+        self.assertEqual(data['values']['serial_number'], 'SN-1')
+        self.assertEqual(data['values']['purchase_date'], '2026-01-15')
+        self.repair_request.refresh_from_db()
+        self.assertEqual(self.repair_request.serial_number, 'SN-1')
+        self.assertEqual(self.repair_request.version, version)
+
+    def test_malformed_body(self):
+        response = self.client.patch(self.url, 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.service_user)
+
+        response = self.patch({'serial_number': 'SN-2'}, client=client)
+
+        self.assertEqual(response.status_code, 403)
+        self.repair_request.refresh_from_db()
+        self.assertEqual(self.repair_request.serial_number, 'SN-1')
+
+    def test_only_service_center_and_patch(self):
+        self.client.force_login(self.dealer)
+        self.assertEqual(self.patch({'serial_number': 'SN-2'}).status_code, 403)
+
+        self.client.force_login(self.service_user)
+        self.assertEqual(self.client.post(self.url, {'serial_number': 'SN-2'}).status_code, 405)
+
+
+class TrackingCacheTests(TestCase):
+    """Кэш страницы отслеживания (tracking.get_tracking_result) сбрасывается сигналами после коммита."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dealer = CustomUser.objects.create_user('dealer', password='pw', role='dealer')
+        cls.product = Product.objects.create(name='Test Sub')
+
+    def setUp(self):
+        cache.clear()
+
+    def create_request(self, **kwargs):
+        return RepairRequest.objects.create(
+            serial_number='SN-1',
+            product=self.product,
+            purchase_date=datetime.date(2026, 1, 15),
+            warranty_status='warranty',
+            problem_description='Не включается',
+            created_by=self.dealer,
+            **kwargs,
+        )
+
+    def cache_concurrent_lookup(self, result):
+        # Поиск из другого соединения между сохранением и коммитом видит прежние строки
+        # и кладёт их в кэш под текущей версией
+        cache.set(RESULT_KEY % ('SN-1', _get_version('SN-1')), result)
+
+    def test_lookup_before_commit_is_not_served_after_create(self):
+        self.assertFalse(get_tracking_result('SN-1')['found'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_request()
+            self.cache_concurrent_lookup({'found': False, 'html': ''})
+
+        self.assertTrue(get_tracking_result('SN-1')['found'])
+
+    def test_lookup_before_commit_is_not_served_after_status_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            repair_request = self.create_request()
+        stale = get_tracking_result('SN-1')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            repair_request.status = 'closed'
+            repair_request.save()
+            self.cache_concurrent_lookup(stale)
+
+        self.assertNotEqual(get_tracking_result('SN-1')['html'], stale['html'])
+
+
+def legacy_act_text(repair_request):
+    """Выбор текста акта до перехода на таблицу правил (act_rules.py) — эталон для сравнения."""
+    decision = repair_request.decision
+    conclusion = repair_request.conclusion
+    detected_problem = repair_request.detected_problem or ""
+    refusal_reason = repair_request.refusal_reason or ""
+    not_factory_defect = (
+        f"В результате лабораторного исследования выявлено: {detected_problem}. Что не является заводским браком.\n"
+        "\n"
+        "Проведенный анализ показывает, что эксплуатация изделия проходила с нарушениями требований, "
+        "оговоренных в «Руководстве по эксплуатации». В связи с этим сообщаем, что на данное изделие условия "
+        "гарантийного ремонта, обмена или компенсации не распространяются."
+    )
+
+    if decision in ['paid_repair', 'hydra_repair', 'demo_repair']:
+        repair_type_text = "Работы"
+        if repair_request.repair_type == 'acoustics' and repair_request.acoustics_repair_subtype:
+            repair_type_text = repair_request.acoustics_repair_subtype
+        elif repair_request.repair_type == 'amplifier' and repair_request.amplifier_repair_subtype:
+            repair_type_text = repair_request.amplifier_repair_subtype
+        elif repair_request.repair_type and repair_request.get_repair_type_display():
+            repair_type_text = repair_request.get_repair_type_display()
+        return not_factory_defect + (
+            "\n\nСтоимость негарантийного ремонта:\n"
+            f"1. Стоимость комплектующих - {repair_request.parts_cost or 0:.2f} руб.\n"
+            f"2. {repair_type_text} - {repair_request.labor_cost or 0:.2f} руб.\n"
+            f"Итого: {repair_request.total_cost or 0:.2f} руб."
+        )
+    elif decision == 'return':
+        if refusal_reason == 'no_spare_parts':
+            return not_factory_defect + " Платный ремонт невозможен в связи с отсутствием запасных частей."
+        elif refusal_reason == 'client_refused':
+            return not_factory_defect + " Клиент отказался от платного ремонта."
+        elif conclusion == 'not_factory_defect':
+            return not_factory_defect
+        else:
+            return ("В результате лабораторного исследования дефектов не обнаружено. "
+                    "Товар полностью исправен и отвечает заявленным характеристикам.")
+    elif decision == 'warranty_repair':
+        return (f"В результате лабораторного исследования выявлено: {detected_problem}.\n"
+                "Все неисправности устранены согласно гарантийным обязательствам.")
+    elif decision == 'exchange':
+        if conclusion == 'factory_defect':
+            return (f"В результате лабораторного исследования выявлено: {detected_problem}. Что является заводским браком.\n"
+                    "Товар будет заменен на новый.")
+        return (f"В результате лабораторного исследования выявлено: {detected_problem}.\n"
+                "Товар будет заменен на новый.")
+    else:
+        detected = detected_problem or "не указано"
+        conclusion_text = repair_request.get_conclusion_display() if repair_request.conclusion else "не указано"
+        decision_text = repair_request.get_decision_display() if repair_request.decision else "не указано"
+        return f"В результате лабораторного исследования выявлено: {detected}\nи принято следующее заключение: {conclusion_text} {decision_text}."
+
+
+class ActRulesTests(TestCase):
+    """Таблица правил акта (act_rules.py) даёт те же тексты, что и прежняя цепочка условий."""
+
+    def test_every_combination_matches_legacy_text(self):
+        for decision, conclusion, refusal_reason in product(DECISIONS, CONCLUSIONS, REFUSAL_REASONS):
+            for repair_type, extra in (('', {}), ('acoustics', {'acoustics_repair_subtype': 'Замена динамика'})):
+                repair_request = RepairRequest(
+                    decision=decision,
+                    conclusion=conclusion,
+                    refusal_reason=refusal_reason,
+                    detected_problem='Обрыв катушки',
+                    repair_type=repair_type,
+                    parts_cost=Decimal('1200.50'),
+                    labor_cost=Decimal('800'),
+                    total_cost=Decimal('2000.50'),
+                    **extra,
+                )
+                with self.subTest(decision=decision, conclusion=conclusion, refusal_reason=refusal_reason,
+                                  repair_type=repair_type):
+                    self.assertEqual(generate_act_text(repair_request), legacy_act_text(repair_request))
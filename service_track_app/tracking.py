@@ -0,0 +1,74 @@
+# service_track_app/tracking.py
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .catalog import attach_products
+from .models import ArchivedRepairRequest, RepairRequest
+
+VERSION_KEY = 'tracking:version:%s'
+RESULT_KEY = 'tracking:result:%s:%s'
+
+
+def _get_version(serial_key):
+    """
+    Текущая версия кэша для серийного номера.
+    Версия — метка времени, поэтому после вытеснения ключа из кэша старые результаты не воскресают.
+    """
+    key = VERSION_KEY % serial_key
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_tracking_cache(serial_key):
+    """Сбрасывает кэш отслеживания для серийного номера (новая версия — новые ключи)."""
+    if serial_key:
+        cache.set(VERSION_KEY % serial_key, time.time_ns(), timeout=None)
+
+
+def build_tracking_result(serial_key):
+    """
+    Ищет заявки по серийному номеру и рендерит блок с историей статусов.
+    Возвращает dict: found — найдена ли заявка, html — готовый фрагмент страницы.
+    """
+    # Один серийный номер может ремонтироваться несколько раз: берём самую свежую заявку по индексу
+    matches = list(
+        RepairRequest.objects.filter(serial_key=serial_key).order_by('-created_at', '-id')
+    )
+    # Завершённые заявки могли уйти в архив (archive.py) — они тоже видны, прозрачно для покупателя
+    archived = {
+        archived_request.id: archived_request
+        for archived_request in ArchivedRepairRequest.objects.filter(serial_key=serial_key)
+    }
+    if archived:
+        matches += attach_products(archived_request.to_repair_request() for archived_request in archived.values())
+        matches.sort(key=lambda match: (match.created_at, match.id), reverse=True)
+    if not matches:
+        return {'found': False, 'html': ''}
+
+    repair_request, earlier_requests = matches[0], matches[1:]
+    history = archived[repair_request.id].history if repair_request.id in archived else repair_request.history
+    # Берём только изменения статуса (диапазон по индексу requesthistory_event_idx / archivedhistory_event_idx)
+    status_history = history.filter(event_type='status').order_by('changed_at')
+
+    html = render_to_string('service_track_app/includes/tracking_result.html', {
+        'repair_request': repair_request,
+        'earlier_requests': earlier_requests,
+        'status_history': status_history,
+    })
+    return {'found': True, 'html': html}
+
+
+def get_tracking_result(serial_key):
+    """Результат отслеживания из кэша; при промахе строит его и кладёт под текущую версию."""
+    key = RESULT_KEY % (serial_key, _get_version(serial_key))
+    result = cache.get(key)
+    if result is None:
+        result = build_tracking_result(serial_key)
+        cache.set(key, result, timeout=settings.TRACKING_CACHE_TIMEOUT)
+    return result
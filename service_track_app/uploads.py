@@ -0,0 +1,171 @@
+# service_track_app/uploads.py
+import fcntl
+import hashlib
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import MediaBlob, RepairRequestVideo, VideoUpload
+from .storage import content_name, media_storage
+
+VIDEO_EXTENSIONS = ('mp4', 'avi', 'mov', 'wmv')
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Незавершённые хэши по token: {token: (offset, hasher)}. Если воркер сменился или перезапустился,
+# хэш один раз пересчитывается по уже записанной части файла (см. _get_hasher)
+_hashers = OrderedDict()
+_MAX_HASHERS = 100
+
+
+def partial_path(upload):
+    return os.path.join(settings.VIDEO_UPLOAD_TEMP_DIR, f"{upload.token}.part")
+
+
+@contextmanager
+def lock_partial_file(upload):
+    """
+    Эксклюзивная блокировка недокачанного файла: блоки одной загрузки пишутся по одному.
+    Блокировка файловая, а не строки в БД, — пока блок читается из сети, транзакция не открыта.
+    """
+    os.makedirs(settings.VIDEO_UPLOAD_TEMP_DIR, exist_ok=True)
+    with open(partial_path(upload), 'ab') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def validate_video_upload(filename, size):
+    """Проверка до начала загрузки: расширение и заявленный размер."""
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    if extension not in VIDEO_EXTENSIONS:
+        raise ValidationError(f"Недопустимый формат видео: {extension or 'без расширения'}. "
+                              f"Разрешены: {', '.join(VIDEO_EXTENSIONS)}")
+    if size <= 0:
+        raise ValidationError("Пустой файл")
+    if size > settings.VIDEO_UPLOAD_MAX_SIZE:
+        raise ValidationError(f"Видео слишком большое (макс. {settings.VIDEO_UPLOAD_MAX_SIZE // (1024 * 1024)} МБ)")
+
+
+def _validate_signature(filename, head):
+    """Проверка сигнатуры контейнера по первым байтам потока, чтобы под .mp4 не пришло что-то иное."""
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    if extension in ('mp4', 'mov'):
+        valid = head[4:8] in (b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip')
+    elif extension == 'avi':
+        valid = head[:4] == b'RIFF' and head[8:12] == b'AVI '
+    elif extension == 'wmv':
+        valid = head[:4] == b'\x30\x26\xb2\x75'
+    else:
+        valid = False
+    if not valid:
+        raise ValidationError("Содержимое файла не похоже на видео заявленного формата")
+
+
+def _get_hasher(upload):
+    cached = _hashers.pop(upload.token, None)
+    if cached and cached[0] == upload.offset:
+        hasher = cached[1]
+    else:
+        hasher = hashlib.sha256()
+        if upload.offset:
+            # Только подтверждённая часть: за ней может остаться блок, не засчитанный в БД
+            remaining = upload.offset
+            with open(partial_path(upload), 'rb') as f:
+                while remaining:
+                    block = f.read(min(STREAM_BLOCK_SIZE, remaining))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    remaining -= len(block)
+    return hasher
+
+
+def _remember_hasher(upload, hasher):
+    _hashers[upload.token] = (upload.offset, hasher)
+    while len(_hashers) > _MAX_HASHERS:
+        _hashers.popitem(last=False)
+
+
+def write_chunk(upload, stream, length):
+    """
+    Дописывает очередной блок из потока запроса в файл на диске, не держа его в памяти целиком.
+    Вызывается под lock_partial_file(upload); offset, sha256 и status обновляются, но не сохраняются.
+    """
+    if upload.offset + length > upload.size:
+        raise ValidationError("Блок выходит за заявленный размер файла")
+
+    os.makedirs(settings.VIDEO_UPLOAD_TEMP_DIR, exist_ok=True)
+    hasher = _get_hasher(upload)
+    check_signature = upload.offset == 0
+    remaining = length
+
+    with open(partial_path(upload), 'r+b' if upload.offset else 'wb') as f:
+        f.seek(upload.offset)
+        f.truncate()
+        while remaining:
+            block = stream.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            if check_signature:
+                _validate_signature(upload.filename, block)
+                check_signature = False
+            f.write(block)
+            hasher.update(block)
+            remaining -= len(block)
+
+    if remaining:
+        # Соединение оборвалось посреди блока — откатываемся к началу блока, клиент повторит его
+        with open(partial_path(upload), 'r+b') as f:
+            f.truncate(upload.offset)
+        _hashers.pop(upload.token, None)
+        raise ValidationError("Блок получен не полностью")
+
+    upload.offset += length
+    if upload.offset == upload.size:
+        upload.sha256 = hasher.hexdigest()
+        upload.status = 'complete'
+        _hashers.pop(upload.token, None)
+    else:
+        _remember_hasher(upload, hasher)
+
+
+def attach_video_upload(upload, repair_request):
+    """
+    Прикрепляет загруженный файл к заявке. Хэш уже посчитан при загрузке, поэтому файл сразу
+    получает имя по содержимому и переносится переименованием; если такое видео уже есть — переиспользуется.
+    Сохраняет upload. Повторная отправка того же token (двойной submit) возвращает уже прикреплённое видео.
+    """
+    name = content_name('repair_videos', upload.sha256, os.path.splitext(upload.filename)[1])
+    with transaction.atomic():
+        # Статус перечитываем под блокировкой: параллельный запрос мог прикрепить загрузку после нашей выборки
+        upload.refresh_from_db(
+            from_queryset=VideoUpload.objects.select_for_update(), fields=['status', 'video']
+        )
+        if upload.status != 'complete':
+            return upload.video
+
+        # Как в ContentAddressedStorage.save: файл без ссылок может удаляться прямо сейчас — кладём свой
+        if MediaBlob.lock(name).ref_count and media_storage.exists(name):
+            try:
+                os.remove(partial_path(upload))
+            except FileNotFoundError:
+                pass
+        else:
+            target = media_storage.path(name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(partial_path(upload), target)
+
+        video = RepairRequestVideo(repair_request=repair_request)
+        video.video.name = name
+        video.save()
+
+        upload.video = video
+        upload.status = 'attached'
+        upload.save(update_fields=['video', 'status'])
+    return video
@@ -10,13 +10,24 @@ urlpatterns = [
     # path('tracking/', views.tracking_view, name='track_request'),
     path("tracking/", views.track_request_view, name="track_request"),
     path('create/', views.create_request_view, name='create_request'),
+    path('create/import/', views.import_requests_view, name='import_requests'),
+    path('api/products/autocomplete/', views.product_autocomplete, name='product_autocomplete'),
+    path('api/uploads/video/', views.video_upload_start, name='video_upload_start'),
+    path('api/uploads/video/<uuid:token>/', views.video_upload_chunk, name='video_upload_chunk'),
     path('requests/', views.my_requests_view, name='my_requests'),
     path('sent/', views.sent_requests_view, name='sent_requests'),
+    path('sent/more/', views.sent_requests_more, name='sent_requests_more'),
     path('received/', views.received_requests, name='received_requests'),
+    path('received/more/', views.received_requests_more, name='received_requests_more'),
+    path('search/', views.search_requests, name='search_requests'),
+    path('search/more/', views.search_requests_more, name='search_requests_more'),
     path('request_detail/<int:request_id>/', views.request_detail, name='request_detail'),
+    path('request_detail/<int:request_id>/media/<int:media_id>/', views.archived_media, name='archived_media'),
     path("my-requests/send/", views.sent_requests_view, name="send_selected_requests"),
     path('package/<int:package_id>/', views.package_detail_view, name='package_detail'),
     path('sc/package/<int:package_id>/', views.sc_package_detail, name='sc_package_detail'),
+    path('sc/package/<int:package_id>/acts.zip', views.sc_package_acts_zip, name='sc_package_acts_zip'),
+    path('sc/export/', views.export_requests, name='export_requests'),
     path('update_request_status/<int:request_id>/', views.update_request_status, name='update_request_status'),
     path('package/<int:package_id>/accept-selected/',
          views.accept_selected_requests,
@@ -1,22 +1,45 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from .forms import RepairRequestForm, RepairRequestEditForm
-from .models import RepairRequest, Package, RequestHistory, RepairRequestPhoto, RepairRequestVideo
+from .forms import RepairRequestForm, RepairRequestEditForm, RequestExportForm
+from .models import (RepairRequest, Package, RequestHistory, RepairRequestPhoto, RepairRequestVideo, VideoUpload,
+                     ArchivedMediaFile, ArchivedRepairRequest, normalize_serial_number)
 
 from django.contrib.auth import login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
+from .archive import iter_archived_media, media_archive_path
+from .acts import ACT_CONTENT_TYPE, ACT_TEMPLATE_PATH, render_act_docx, stream_package_acts_zip
+from .catalog import attach_products, search_products
 from .decorators import role_required
+from .exports import XLSX_CONTENT_TYPE, export_queryset, iter_export_rows, stream_csv, stream_xlsx
+from .pagination import get_page_size, keyset_page, pagination_context
+from .request_import import import_repair_requests
+from .search import search_request_ids
+from .services import (send_requests_to_service, accept_package_requests, save_request_changes, AUTOSAVE_FIELDS,
+                       SENDABLE_STATUSES, StaleVersionError)
+from .tracking import get_tracking_result
+from .uploads import attach_video_upload, lock_partial_file, validate_video_upload, write_chunk
 
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.contrib import messages
 from django.urls import reverse
-from django.db.models import F, Count
+from django.db.models import CharField, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, NullIf
 from collections import defaultdict
 
-from docxtpl import DocxTemplate
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.views.decorators.http import require_http_methods
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.utils.http import content_disposition_header
+import hashlib
+import json
+import mimetypes
 import os
-from io import BytesIO
+import uuid
+from io import TextIOWrapper
 
 
 def user_login(request):
@@ -43,28 +66,33 @@ def tracking_view(request):
 
 
 def track_request_view(request):
-    repair_request = None
-    status_history = RequestHistory.objects.none()
+    tracking_result = None
 
     if request.method == 'POST':
         serial_number = request.POST.get('serial_number', '').strip().upper()
+        serial_key = normalize_serial_number(serial_number)
 
-        if not serial_number:
+        if not serial_key:
             messages.error(request, "Пожалуйста, введите серийный номер.")
         else:
-            try:
-                repair_request = get_object_or_404(RepairRequest, serial_number__iexact=serial_number)
-                # status_history = repair_request.history.order_by('changed_at')
-                if repair_request:
-                    # Берём только изменения статуса
-                    status_history = repair_request.history.exclude(old_status=F('new_status')).order_by('changed_at')
-            except:
+            # Результат берётся из кэша по нормализованному серийному номеру
+            result = get_tracking_result(serial_key)
+            if result['found']:
+                tracking_result = mark_safe(result['html'])
+            else:
                 messages.error(request, f"Заявка с серийным номером {serial_number} не найдена.")
-    print("!!!", status_history)
-    for h in status_history:
-        print(h.changed_at)  # теперь это работает
 
-    return render(request, 'service_track_app/tracking.html', {"repair_request": repair_request, "status_history": status_history})
+    return render(request, 'service_track_app/tracking.html', {"tracking_result": tracking_result})
+
+
+def _parse_tokens(values):
+    tokens = []
+    for value in values:
+        try:
+            tokens.append(uuid.UUID(value))
+        except ValueError:
+            continue
+    return tokens
 
 
 @login_required
@@ -101,6 +129,14 @@ def create_request_view(request):
                     video=video
                 )
 
+            # Видео, заранее загруженные поблочно, прикрепляем по токенам
+            for upload in VideoUpload.objects.filter(
+                token__in=_parse_tokens(request.POST.getlist('video_tokens')),
+                created_by=request.user,
+                status='complete'
+            ):
+                attach_video_upload(upload, repair_request)
+
             # --- Создаём запись в истории сразу после создания ---
             RequestHistory.objects.create(
                 repair_request=repair_request,
@@ -113,7 +149,137 @@ def create_request_view(request):
     else:
         form = RepairRequestForm()
 
-    return render(request, "service_track_app/create.html", {"form": form})
+    return render(request, "service_track_app/create.html", {
+        "form": form,
+        "video_max_mb": settings.VIDEO_UPLOAD_MAX_SIZE // (1024 * 1024),
+    })
+
+
+@login_required
+@role_required(['dealer'])
+@require_http_methods(['POST'])
+def video_upload_start(request):
+    """Начало поблочной загрузки видео: проверяем имя и размер, выдаём токен."""
+    filename = request.POST.get('filename', '')
+    try:
+        size = int(request.POST.get('size', ''))
+        validate_video_upload(filename, size)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Некорректный размер файла'}, status=400)
+    except ValidationError as e:
+        return JsonResponse({'success': False, 'error': e.messages[0]}, status=400)
+
+    upload = VideoUpload.objects.create(created_by=request.user, filename=filename, size=size)
+    return JsonResponse({
+        'success': True,
+        'token': str(upload.token),
+        'offset': 0,
+        'chunk_size': settings.VIDEO_UPLOAD_CHUNK_SIZE,
+    })
+
+
+@login_required
+@role_required(['dealer'])
+@require_http_methods(['GET', 'PUT'])
+def video_upload_chunk(request, token):
+    """
+    GET — сколько байт уже получено (для возобновления после обрыва).
+    PUT — очередной блок; X-Upload-Offset должен совпадать с уже полученным объёмом.
+    """
+    upload = get_object_or_404(VideoUpload, token=token, created_by=request.user)
+
+    if request.method == 'PUT':
+        try:
+            offset = int(request.headers.get('X-Upload-Offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Некорректные заголовки блока'}, status=400)
+        if not 0 < length <= settings.VIDEO_UPLOAD_CHUNK_SIZE:
+            return JsonResponse({'success': False, 'error': 'Недопустимый размер блока'}, status=400)
+
+        # Блок до VIDEO_UPLOAD_CHUNK_SIZE читается из сети без открытой транзакции: иначе медленный клиент
+        # держал бы блокировку записи (на SQLite — всей базы). Блоки одной загрузки идут по одному под lock_partial_file
+        if upload.status != 'uploading':
+            return _chunk_conflict(upload)
+        with lock_partial_file(upload):
+            # Под блокировкой файла — актуальные offset и status
+            upload.refresh_from_db(fields=['offset', 'sha256', 'status'])
+            if upload.status != 'uploading' or offset != upload.offset:
+                # Клиент рассинхронизировался (повтор блока, второй вкладкой и т.п.) — сообщаем актуальное смещение
+                return _chunk_conflict(upload)
+            try:
+                write_chunk(upload, request, length)
+            except ValidationError as e:
+                return JsonResponse({'success': False, 'error': e.messages[0], 'offset': upload.offset}, status=400)
+            # Блок засчитывается, только если смещение в БД за это время не изменилось
+            if not VideoUpload.objects.filter(pk=upload.pk, status='uploading', offset=offset).update(
+                offset=upload.offset, sha256=upload.sha256, status=upload.status
+            ):
+                return _chunk_conflict(VideoUpload.objects.get(pk=upload.pk))
+
+    return JsonResponse({
+        'success': True,
+        'token': str(upload.token),
+        'offset': upload.offset,
+        'size': upload.size,
+        'status': upload.status,
+    })
+
+
+def _chunk_conflict(upload):
+    return JsonResponse({'success': False, 'error': 'Неверное смещение блока',
+                         'offset': upload.offset, 'status': upload.status}, status=409)
+
+
+@login_required
+@role_required(['dealer'])
+def import_requests_view(request):
+    """Загрузка файла с заявками (CSV / JSON / JSONL); ошибочные записи показываются списком"""
+    rejects = []
+    if request.method == "POST" and request.FILES.get('file'):
+        upload = request.FILES['file']
+        encoding = request.POST.get('encoding') if request.POST.get('encoding') in ('utf-8-sig', 'cp1251') else 'utf-8-sig'
+        try:
+            result = import_repair_requests(
+                request.user, TextIOWrapper(upload.file, encoding=encoding, newline=''), upload.name
+            )
+        except (UnicodeDecodeError, ValueError) as e:
+            messages.error(request, f"Не удалось прочитать файл: {e}")
+        else:
+            rejects = result.rejects
+            messages.success(request, f"Импортировано заявок: {result.created}, с ошибками: {len(rejects)}")
+            if result.created and not rejects:
+                return redirect("my_requests")
+
+    return render(request, "service_track_app/import_requests.html", {"rejects": rejects})
+
+
+PRODUCT_AUTOCOMPLETE_PAGE_SIZE = 20
+
+
+@login_required
+def product_autocomplete(request):
+    """Поиск товаров для select2: ?q=слова&page=N, ответ {results: [{id, text}], pagination: {more}}"""
+    query = ' '.join(request.GET.get('q', '').split())[:100]
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    key = 'product_autocomplete:%s:%s' % (hashlib.sha1(query.lower().encode()).hexdigest(), page)
+    data = cache.get(key)
+    if data is None:
+        offset = (page - 1) * PRODUCT_AUTOCOMPLETE_PAGE_SIZE
+        products = list(search_products(query)[offset:offset + PRODUCT_AUTOCOMPLETE_PAGE_SIZE + 1])
+        data = {
+            'results': [{'id': p.id, 'text': p.display_name()} for p in products[:PRODUCT_AUTOCOMPLETE_PAGE_SIZE]],
+            'pagination': {'more': len(products) > PRODUCT_AUTOCOMPLETE_PAGE_SIZE},
+        }
+        cache.set(key, data, timeout=settings.PRODUCT_AUTOCOMPLETE_CACHE_TIMEOUT)
+
+    response = JsonResponse(data)
+    patch_cache_control(response, private=True, max_age=settings.PRODUCT_AUTOCOMPLETE_CACHE_TIMEOUT)
+    return response
 
 
 @login_required
@@ -128,50 +294,19 @@ def my_requests_view(request):
     if request.method == "POST":
         # Получаем список ID выбранных заявок из формы
         ids = request.POST.getlist("selected_requests")
-        print('1'*50)
-        print(ids)
         if ids:
-            # Создаём новый пакет
-            pkg = Package.objects.create(
-                created_by=request.user,
-                dealer_company=request.user.dealer_company  # если у пользователя есть дилерская компания
-            )
-
-            # # Обновляем статус и время отправки выбранных заявок
-            # RepairRequest.objects.filter(id__in=ids).update(
-            #     status='sent_to_service',
-            #     sent_at=timezone.now()
-            # )
-            # Привязываем заявки к пакету и обновляем статус
-            # RepairRequest.objects.filter(id__in=ids).update(
-            #     status='sent_to_service',
-            #     sent_at=timezone.now(),
-            #     package=pkg
-            # )
-
-            # Получаем объекты заявок
-            selected_requests = RepairRequest.objects.filter(id__in=ids)
-
-            # Привязываем заявки к пакету и обновляем статус
-            for repair_request in selected_requests:
-                previous_status = repair_request.status  # сохраняем текущий статус перед изменением
-                repair_request.status = 'sent_to_service'
-                repair_request.sent_at = timezone.now()
-                repair_request.package = pkg
-                repair_request.save()
-
-                # --- Создаём запись в истории ---
-                RequestHistory.objects.create(
-                    repair_request=repair_request,
-                    changed_by=request.user,
-                    old_status=previous_status,  # если нужно, можно сохранять предыдущий статус
-                    new_status=repair_request.status,
-                    comment="Отправлено в сервисный центр"
-                )
-            messages.success(request, f"Отправлено {len(ids)} заявок в сервисный центр.")
+            # Пакет, статусы и история создаются в одной транзакции
+            pkg, sent_ids = send_requests_to_service(request.user, ids)
+            if not sent_ids:
+                messages.warning(request, "Выбранные заявки уже отправлены или недоступны для отправки.")
+                return redirect('my_requests')
+
+            messages.success(request, f"Отправлено {len(sent_ids)} заявок в сервисный центр.")
+            if len(sent_ids) < len(ids):
+                messages.warning(request, f"Пропущено {len(ids) - len(sent_ids)} заявок: они уже отправлены или недоступны.")
             remaining = RepairRequest.objects.filter(
                 created_by=request.user,
-                status__in=['in_progress', 'waiting']
+                status__in=SENDABLE_STATUSES
             ).exists()
             url = reverse('my_requests') + '?sent=1&all_sent=' + ('0' if remaining else '1')
             return redirect(url)
@@ -231,30 +366,51 @@ def my_requests_view(request):
 #         })
 
 
+def _sent_packages_page(request):
+    status_filter = request.GET.get('status', 'all')
+
+    if request.user.role == 'dealer':
+        packages = Package.objects.filter(created_by=request.user)
+    elif request.user.role == 'service_center':
+        packages = Package.objects.all()
+    else:
+        packages = Package.objects.none()
+
+    # Фильтрация по статусу
+    if status_filter != 'all':
+        packages = packages.filter(status=status_filter)
+
+    # Предзагрузка связанных заявок; товары — из кэша каталога, количество заявок — из счётчиков пакета
+    packages = packages.select_related('dealer_company').prefetch_related('requests')
+
+    page_size = get_page_size(request)
+    packages, next_cursor = keyset_page(packages, request.GET.get('cursor'), page_size)
+    attach_products(r for p in packages for r in p.requests.all())
+    return {
+        "packages": packages,
+        "current_status": status_filter,
+        **pagination_context(request, page_size, next_cursor, 'sent_requests_more'),
+    }
+
+
+def _fragment_response(request, template_name, context):
+    # Фрагмент для кнопки «Показать ещё»: курсор следующей страницы передаётся заголовком
+    response = render(request, template_name, context)
+    if context['next_cursor']:
+        response['X-Next-Cursor'] = context['next_cursor']
+    return response
+
+
 def sent_requests_view(request):
     if request.method == "POST":
         return redirect('sent_requests')
     else:
-        status_filter = request.GET.get('status', 'all')
+        return render(request, "service_track_app/sent.html", _sent_packages_page(request))
 
-        if request.user.role == 'dealer':
-            packages = Package.objects.filter(created_by=request.user)
-        elif request.user.role == 'service_center':
-            packages = Package.objects.all()
-        else:
-            packages = Package.objects.none()
 
-        # Фильтрация по статусу
-        if status_filter != 'all':
-            packages = packages.filter(status=status_filter)
-
-        # Предзагрузка связанных заявок с товарами
-        packages = packages.prefetch_related('requests__product').order_by('-created_at')
-
-        return render(request, "service_track_app/sent.html", {
-            "packages": packages,
-            "current_status": status_filter
-        })
+@login_required
+def sent_requests_more(request):
+    return _fragment_response(request, "service_track_app/includes/sent_package_cards.html", _sent_packages_page(request))
 
 
 # @login_required
@@ -302,38 +458,92 @@ def sent_requests_view(request):
 #         })
 
 
+def _received_page(request):
+    status_filter = request.GET.get('status', 'all')
+    show_requests = request.GET.get('view', 'packages') == 'requests'
+    page_size = get_page_size(request)
+    cursor = request.GET.get('cursor')
+
+    # Загружаем только ту вкладку, которая открыта
+    if show_requests:
+        # Отдельные заявки (все заявки со статусом отправки в СЦ)
+        repair_requests = RepairRequest.objects.filter(
+            status='sent_to_service'
+        ).select_related('dealer_company')
+        repair_requests, next_cursor = keyset_page(repair_requests, cursor, page_size)
+        attach_products(repair_requests)
+        packages = []
+    else:
+        # Для СЦ показываем все пакеты
+        packages = Package.objects.all()
+
+        # Фильтрация пакетов по статусу
+        if status_filter != 'all':
+            packages = packages.filter(status=status_filter)
+
+        # Предзагрузка связанных заявок; товары — из кэша каталога
+        packages = packages.select_related('dealer_company').prefetch_related('requests')
+        packages, next_cursor = keyset_page(packages, cursor, page_size)
+        attach_products(r for p in packages for r in p.requests.all())
+        repair_requests = []
+
+    return {
+        "packages": packages,
+        "repair_requests": repair_requests,
+        "current_status": status_filter,
+        "show_requests": show_requests,  # Определяем какой вид показывать
+        **pagination_context(request, page_size, next_cursor, 'received_requests_more'),
+    }
+
+
 @login_required
 @role_required(['service_center'])
 def received_requests(request):
     if request.method == "POST":
         return redirect('received_requests')
     else:
-        status_filter = request.GET.get('status', 'all')
-        view_type = request.GET.get('view', 'packages')  # Получаем тип view
+        return render(request, "service_track_app/received.html", _received_page(request))
 
-        # Для СЦ показываем все пакеты
-        packages = Package.objects.all()
 
-        # Отдельные заявки (все заявки со статусом отправки в СЦ)
-        repair_requests = RepairRequest.objects.filter(
-            status='sent_to_service'
-        ).select_related('product').order_by('-created_at')
+@login_required
+@role_required(['service_center'])
+def received_requests_more(request):
+    context = _received_page(request)
+    if context['show_requests']:
+        return _fragment_response(request, "service_track_app/includes/received_request_rows.html", context)
+    return _fragment_response(request, "service_track_app/includes/received_package_cards.html", context)
+
+
+def _search_page(request):
+    query = request.GET.get('q', '').strip()
+    page_size = get_page_size(request)
+    # Результаты упорядочены по релевантности, поэтому курсор — просто смещение
+    cursor = request.GET.get('cursor', '')
+    offset = int(cursor) if cursor.isdigit() else 0
+
+    # Дилер ищет среди своих заявок, СЦ — среди всех
+    created_by = request.user if request.user.role == 'dealer' else None
+    ids = search_request_ids(query, created_by=created_by, limit=page_size + 1, offset=offset) if query else []
+    next_cursor = str(offset + page_size) if len(ids) > page_size else None
+
+    found = RepairRequest.objects.select_related('dealer_company').in_bulk(ids[:page_size])
+    repair_requests = attach_products(found[request_id] for request_id in ids[:page_size] if request_id in found)
+    return {
+        "query": query,
+        "repair_requests": repair_requests,
+        **pagination_context(request, page_size, next_cursor, 'search_requests_more'),
+    }
 
-        # Фильтрация пакетов по статусу
-        if status_filter != 'all':
-            packages = packages.filter(status=status_filter)
 
-        # Предзагрузка связанных заявок с товарами
-        packages = packages.prefetch_related('requests__product').order_by('-created_at')
+@login_required
+def search_requests(request):
+    """Полнотекстовый поиск заявок: серийный номер, покупатель, телефон, описания неисправности, товар"""
+    return render(request, "service_track_app/search.html", _search_page(request))
 
-        print('!!!!!!!!!!!!',view_type)
 
-        return render(request, "service_track_app/received.html", {
-            "packages": packages,
-            "repair_requests": repair_requests,  # Добавляем отдельные заявки
-            "current_status": status_filter,
-            "show_requests": view_type == 'requests'  # Определяем какой вид показывать
-        })
+@login_required
+def search_requests_more(request):
+    return _fragment_response(request, "service_track_app/includes/received_request_rows.html", _search_page(request))
 
 
 @login_required
@@ -365,16 +575,68 @@ def package_detail_view(request, package_id):
     })
 
 
+def _media_count(model):
+    # Количество медиа заявки коррелированным подзапросом: без JOIN-размножения строк и без загрузки самих файлов
+    return Coalesce(Subquery(
+        model.objects.filter(repair_request=OuterRef('pk'))
+        .order_by().values('repair_request').annotate(count=Count('id')).values('count')
+    ), 0)
+
+
 def sc_package_detail(request, package_id):
     package = get_object_or_404(Package, id=package_id)
-    # requests = package.requests.all()
-    requests = package.requests.all().prefetch_related('photos', 'videos')
+    # Превью — миниатюра первого фото, для ещё не обработанных фото — оригинал
+    first_photo = (
+        RepairRequestPhoto.objects.filter(repair_request=OuterRef('pk')).order_by('id')
+        .annotate(src=Coalesce(NullIf('thumbnail', Value('')), 'photo', output_field=CharField())).values('src')[:1]
+    )
+    requests = attach_products(package.requests.annotate(
+        photo_count=_media_count(RepairRequestPhoto),
+        video_count=_media_count(RepairRequestVideo),
+        first_photo=Subquery(first_photo),
+    ))
     return render(request, 'service_track_app/sc_package_detail.html', {
         'p': package,
         'requests': requests
     })
 
 
+@login_required
+@role_required(['service_center'])
+def sc_package_acts_zip(request, package_id):
+    """Акты по всем заявкам пакета одним ZIP-архивом (отдаётся потоком по мере готовности документов)"""
+    package = get_object_or_404(Package, id=package_id)
+    if not os.path.exists(ACT_TEMPLATE_PATH):
+        return HttpResponse(f"Шаблон не найден: {ACT_TEMPLATE_PATH}", status=404)
+
+    requests = attach_products(package.requests.order_by('id'))
+    response = StreamingHttpResponse(stream_package_acts_zip(requests), content_type='application/zip')
+    response['Content-Disposition'] = (
+        f'attachment; filename="Акты_пакет_№{package.id}_{package.created_at.strftime("%d.%m.%Y")}.zip"'
+    )
+    return response
+
+
+@login_required
+@role_required(['service_center'])
+def export_requests(request):
+    """Выгрузка заявок в CSV/XLSX по фильтрам; файл отдаётся потоком, строки читаются из БД порциями"""
+    form = RequestExportForm(request.GET or None)
+    if not request.GET or not form.is_valid():
+        return render(request, "service_track_app/export_requests.html", {"form": form})
+
+    rows = iter_export_rows(export_queryset(form.cleaned_data))
+    file_format = form.cleaned_data['format']
+    if file_format == 'xlsx':
+        response = StreamingHttpResponse(stream_xlsx(rows), content_type=XLSX_CONTENT_TYPE)
+    else:
+        response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = content_disposition_header(
+        True, f'Заявки_{timezone.localdate().strftime("%d.%m.%Y")}.{file_format}'
+    )
+    return response
+
+
 # def request_detail(request, request_id):
 #     repair_request = get_object_or_404(RepairRequest, id=request_id)
 #     user_role = request.user.role
@@ -450,7 +712,12 @@ def sc_package_detail(request, package_id):
 
 
 def request_detail(request, request_id):
-    repair_request = get_object_or_404(RepairRequest, id=request_id)
+    repair_request = RepairRequest.objects.filter(id=request_id).first()
+    # Закрытые заявки со временем уходят в архив (archive.py) — показываем их оттуда, только для чтения
+    archived_request = None
+    if repair_request is None:
+        archived_request = get_object_or_404(ArchivedRepairRequest, id=request_id)
+        repair_request = attach_products([archived_request.to_repair_request()])[0]
     user_role = request.user.role
 
     if user_role == 'dealer':
@@ -468,37 +735,41 @@ def request_detail(request, request_id):
             {'title': f'Заявка #{repair_request.id}', 'url': ''}
         ]
 
+    if request.method == 'POST' and archived_request is not None:
+        messages.error(request, f"Заявка #{repair_request.id} перенесена в архив, изменения недоступны.")
+        return redirect('request_detail', request_id=repair_request.id)
+
     if request.method == 'POST':
         form = RepairRequestEditForm(request.POST, instance=repair_request)
         if form.is_valid():
-            previous_status = RepairRequest.objects.get(id=repair_request.id).status
-
             updated_request = form.save(commit=False)
-            updated_request.save()  # сохраняем изменения
-
-            # создаём запись в истории
-            RequestHistory.objects.create(
-                repair_request=updated_request,
-                changed_by=request.user,
-                old_status=previous_status,
-                new_status=updated_request.status,
-                comment=updated_request.additional_notes
-            )
+            # Запись в истории с изменёнными полями создаёт save(); прежние значения известны с загрузки
+            updated_request.history_user = request.user
+            updated_request.history_comment = updated_request.additional_notes
+            updated_request.save()
             return redirect('request_detail', request_id=repair_request.id)
         else:
             print("Ошибки формы:", form.errors)
     else:
         form = RepairRequestEditForm(instance=repair_request)
 
-    # Получаем все фото для этой заявки
-    photos = repair_request.photos.all()
-    videos = repair_request.videos.all()
+    if archived_request is not None:
+        for field in form.fields.values():
+            field.disabled = True
+        media = list(archived_request.media.all())
+        photos = [media_file for media_file in media if media_file.kind == 'photo']
+        videos = [media_file for media_file in media if media_file.kind == 'video']
+    else:
+        # Получаем все фото для этой заявки
+        photos = repair_request.photos.all()
+        videos = repair_request.videos.all()
     print('photos: ',photos)
     print('videos: ', videos)
 
     return render(request, 'service_track_app/request_detail.html', {
         'form': form,
         'repair_request': repair_request,
+        'archived': archived_request is not None,
         'photos': photos,
         'videos': videos,
         'back_url': back_url,
@@ -507,6 +778,23 @@ def request_detail(request, request_id):
     })
 
 
+@login_required
+def archived_media(request, request_id, media_id):
+    """Фото или видео архивной заявки: распаковывается из её zip-архива потоком."""
+    media_file = get_object_or_404(
+        ArchivedMediaFile.objects.select_related('repair_request'), id=media_id, repair_request_id=request_id
+    )
+    if not os.path.exists(media_archive_path(media_file.repair_request.media_archive)):
+        raise Http404("Архив файлов заявки не найден")
+
+    content_type = mimetypes.guess_type(media_file.member)[0] or 'application/octet-stream'
+    response = StreamingHttpResponse(iter_archived_media(media_file), content_type=content_type)
+    response['Content-Length'] = media_file.size
+    # Файлы архивной заявки не меняются
+    patch_cache_control(response, private=True, max_age=60 * 60 * 24 * 30)
+    return response
+
+
 # def request_detail(request, request_id):
 #     repair_request = get_object_or_404(RepairRequest, id=request_id)
 #     user_role = request.user.role
@@ -618,7 +906,11 @@ def update_request_status(request, request_id):
         new_status = request.POST.get("status")
         comment = request.POST.get("comment")
 
-        if new_status != old_status or comment:
+        # Смену статуса записывает в историю save(), комментарий без смены статуса — отдельной записью
+        req.status = new_status
+        req.history_user = request.user
+        req.history_comment = comment
+        if new_status == old_status and comment:
             RequestHistory.objects.create(
                 repair_request=req,
                 changed_by=request.user,
@@ -626,8 +918,6 @@ def update_request_status(request, request_id):
                 new_status=new_status,
                 comment=comment
             )
-
-        req.status = new_status
         req.save()
 
         # После сохранения — редирект на страницу деталей заявки
@@ -686,253 +976,91 @@ def update_request_status(request, request_id):
 def accept_selected_requests(request, package_id):
     if request.method == 'POST':
         selected_ids = request.POST.getlist('selected_requests')
-        package = get_object_or_404(Package, id=package_id)
+        get_object_or_404(Package, id=package_id)
+
+        if not selected_ids:
+            messages.warning(request, 'Не выбрано ни одной заявки для принятия')
+            return redirect('sc_package_detail', package_id=package_id)
 
-        # Получаем все заявки в пакете
-        all_requests_in_package = package.requests.all()
-        all_request_ids = set(all_requests_in_package.values_list('id', flat=True))
-        selected_ids_set = set(map(int, selected_ids)) if selected_ids else set()
+        # Приёмка всего пакета — одна транзакция с блокировкой строк
+        all_selected, results = accept_package_requests(request.user, package_id, selected_ids)
 
         # Проверяем, выбраны ли ВСЕ заявки из пакета
-        if selected_ids_set != all_request_ids:
+        if not all_selected:
             messages.error(request, 'Для принятия пакета необходимо выбрать ВСЕ заявки в пакете')
             return redirect('sc_package_detail', package_id=package_id)
 
-        if selected_ids:
-            for request_id in selected_ids:
-                repair_request = RepairRequest.objects.get(id=request_id)
-                old_status = repair_request.status
-                repair_request.status = 'accepted_by_dealer'
-                repair_request.save()
+        accepted_count = sum(1 for result in results.values() if result == 'accepted')
+        messages.success(request, f'Приняты все {len(results)} заявок пакета ({accepted_count} новых)! Статус пакета обновлен.')
 
-                RequestHistory.objects.create(
-                    repair_request=repair_request,
-                    changed_by=request.user,
-                    old_status=old_status,
-                    new_status='accepted_by_dealer',
-                    comment='Заявка принята в сервисном центре'
-                )
-
-            # Проверяем все ли заявки приняты
-            all_requests = package.requests.all()
-            accepted_requests = all_requests.filter(status='accepted_by_dealer')
+    return redirect('sc_package_detail', package_id=package_id)
 
-            total_count = all_requests.count()
-            accepted_count = accepted_requests.count()
-
-            # Если приняли ВСЕ заявки из пакета
-            if accepted_count == total_count:
-                package.status = 'accepted'
-                package.save()
-                messages.success(request, f'Приняты все {accepted_count} заявок пакета! Статус пакета обновлен.')
-            else:
-                messages.success(request, f'Принято {len(selected_ids)} заявок. В пакете осталось {total_count - accepted_count} не принятых.')
 
-        else:
-            messages.warning(request, 'Не выбрано ни одной заявки для принятия')
-
-        return redirect('sc_package_detail', package_id=package_id)
-
-from django.http import JsonResponse, HttpResponse
-from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
-import json
-
-
-@csrf_exempt
+@login_required
+@role_required(['service_center'])
+@require_http_methods(['PATCH'])
 def update_request_field(request, request_id):
-    print("🎯 Получен запрос для заявки:", request_id)
+    """
+    Автосохранение: пачка изменений полей заявки одним запросом.
+    Тело — JSON {"version": <версия заявки на клиенте>, "changes": {поле: значение}}.
+    Ответ 409 — заявку уже изменили: клиент получает текущие значения и версию.
+    """
+    repair_request = get_object_or_404(RepairRequest, id=request_id)
+    try:
+        payload = json.loads(request.body)
+        version = int(payload['version'])
+        changes = payload['changes']
+        if not isinstance(changes, dict):
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Ожидается JSON {"version": ..., "changes": {...}}'}, status=400)
 
     try:
-        # Получаем заявку из базы
-        service_request = RepairRequest.objects.get(id=request_id)
-        print(f"📦 Найдена заявка: {service_request}")
-
-        # Получаем имя поля и значение из POST данных
-        post_data = dict(request.POST)
-        field_name = None
-        field_value = None
-
-        # Ищем поле для обновления (исключая csrf token)
-        for key, value in post_data.items():
-            if key != 'csrfmiddlewaretoken':
-                field_name = key
-                field_value = value[0] if value else ''  # Берем первое значение
-                break
-
-        if field_name and hasattr(service_request, field_name):
-            print(f"✏️ Обновляем поле '{field_name}' на '{field_value}'")
-
-            # Обновляем поле в модели
-            setattr(service_request, field_name, field_value)
-            service_request.save()
-
-            print(f"✅ Данные сохранены в базу!")
-
-            return JsonResponse({
-                'success': True,
-                'message': f'Поле {field_name} обновлено',
-                'request_id': request_id,
-                'field': field_name,
-                'value': field_value
-            })
-        else:
-            print(f"❌ Поле '{field_name}' не найдено в модели")
-            return JsonResponse({
-                'success': False,
-                'error': f'Поле {field_name} не найдено'
-            }, status=400)
-
-    except RepairRequest.DoesNotExist:
-        print(f"❌ Заявка {request_id} не найдена")
+        saved = save_request_changes(repair_request, version, changes, user=request.user)
+    except StaleVersionError as e:
+        current = e.repair_request
         return JsonResponse({
             'success': False,
-            'error': 'Заявка не найдена'
-        }, status=404)
-    except Exception as e:
-        print(f"❌ Ошибка: {str(e)}")
+            'error': 'Заявку изменил другой пользователь — показаны актуальные значения',
+            'version': current.version,
+            'values': _request_field_values(current, [name for name in changes if name in AUTOSAVE_FIELDS]),
+        }, status=409)
+    except ValidationError as e:
+        # Пачка не сохранена целиком — клиент возвращает в ячейки значения из БД
+        current = RepairRequest.objects.get(id=repair_request.id)
         return JsonResponse({
             'success': False,
-            'error': str(e)
-        }, status=500)
+            'errors': e.message_dict,
+            'version': current.version,
+            'values': _request_field_values(current, [name for name in changes if name in AUTOSAVE_FIELDS]),
+        }, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'version': repair_request.version,
+        'saved': saved,
+        'values': _request_field_values(repair_request, changes),
+    })
+
+
+def _request_field_values(repair_request, field_names):
+    # Значения в виде, пригодном для полей ввода: даты ISO, внешние ключи — id, пусто — ''
+    values = {}
+    for name in field_names:
+        value = RepairRequest._meta.get_field(name).value_from_object(repair_request)
+        values[name] = '' if value is None else str(value)
+    return values
 
 
 def generate_act_docx(request, request_id):
     """Генерация акта в формате DOCX из шаблона"""
-    from .models import RepairRequest
-    from docxtpl import DocxTemplate
-    from django.http import HttpResponse
-    from io import BytesIO
-    import os
-    from django.utils import timezone
-    from django.shortcuts import get_object_or_404
-
     repair_request = get_object_or_404(RepairRequest, id=request_id)
 
-    # ФУНКЦИЯ ДЛЯ ГЕНЕРАЦИИ ТЕКСТА АКТА ПО ПРАВИЛАМ
-    def generate_act_text(repair_request):
-        decision = repair_request.decision
-        conclusion = repair_request.conclusion
-        detected_problem = repair_request.detected_problem or ""
-        refusal_reason = repair_request.refusal_reason or ""
-
-        # ПЛАТНЫЙ РЕМОНТ
-        if decision in ['paid_repair', 'hydra_repair', 'demo_repair']:
-            parts_cost = repair_request.parts_cost or 0
-            labor_cost = repair_request.labor_cost or 0
-            total_cost = repair_request.total_cost or 0
-
-            # Получаем текст типа ремонта
-            repair_type_text = "Работы"
-            if repair_request.repair_type == 'acoustics' and repair_request.acoustics_repair_subtype:
-                repair_type_text = repair_request.acoustics_repair_subtype
-            elif repair_request.repair_type == 'amplifier' and repair_request.amplifier_repair_subtype:
-                repair_type_text = repair_request.amplifier_repair_subtype
-            elif repair_request.repair_type and repair_request.get_repair_type_display():
-                repair_type_text = repair_request.get_repair_type_display()
-
-            text = f"""В результате лабораторного исследования выявлено: {detected_problem}. Что не является заводским браком.
-
-Проведенный анализ показывает, что эксплуатация изделия проходила с нарушениями требований, оговоренных в «Руководстве по эксплуатации». В связи с этим сообщаем, что на данное изделие условия гарантийного ремонта, обмена или компенсации не распространяются.
-
-Стоимость негарантийного ремонта:
-1. Стоимость комплектующих - {parts_cost:.2f} руб.
-2. {repair_type_text} - {labor_cost:.2f} руб.
-Итого: {total_cost:.2f} руб."""
-            return text
-
-        # ВОЗВРАТ БЕЗ РЕМОНТА - проверяем reason_refusal
-        elif decision == 'return':
-            # Если причина отказа "нет запчастей"
-            if refusal_reason == 'no_spare_parts':
-                text = f"""В результате лабораторного исследования выявлено: {detected_problem}. Что не является заводским браком.
-
-Проведенный анализ показывает, что эксплуатация изделия проходила с нарушениями требований, оговоренных в «Руководстве по эксплуатации». В связи с этим сообщаем, что на данное изделие условия гарантийного ремонта, обмена или компенсации не распространяются. Платный ремонт невозможен в связи с отсутствием запасных частей."""
-                return text
-
-            # Если причина отказа "клиент отказался"
-            elif refusal_reason == 'client_refused':
-                text = f"""В результате лабораторного исследования выявлено: {detected_problem}. Что не является заводским браком.
-
-Проведенный анализ показывает, что эксплуатация изделия проходила с нарушениями требований, оговоренных в «Руководстве по эксплуатации». В связи с этим сообщаем, что на данное изделие условия гарантийного ремонта, обмена или компенсации не распространяются. Клиент отказался от платного ремонта."""
-                return text
-
-            # Если не заводской брак (но не указана причина отказа)
-            elif conclusion == 'not_factory_defect':
-                text = f"""В результате лабораторного исследования выявлено: {detected_problem}. Что не является заводским браком.
-
-Проведенный анализ показывает, что эксплуатация изделия проходила с нарушениями требований, оговоренных в «Руководстве по эксплуатации». В связи с этим сообщаем, что на данное изделие условия гарантийного ремонта, обмена или компенсации не распространяются."""
-                return text
-
-            # Если товар исправен (нет проблем)
-            else:
-                return "В результате лабораторного исследования дефектов не обнаружено. Товар полностью исправен и отвечает заявленным характеристикам."
-
-        # ГАРАНТИЙНЫЙ РЕМОНТ
-        elif decision == 'warranty_repair':
-            return f"""В результате лабораторного исследования выявлено: {detected_problem}.
-Все неисправности устранены согласно гарантийным обязательствам."""
-
-        # ОБМЕН ТОВАРА
-        elif decision == 'exchange':
-            if conclusion == 'factory_defect':
-                return f"""В результате лабораторного исследования выявлено: {detected_problem}. Что является заводским браком.
-Товар будет заменен на новый."""
-            else:
-                return f"""В результате лабораторного исследования выявлено: {detected_problem}.
-Товар будет заменен на новый."""
-
-        # ЕСЛИ НИЧЕГО НЕ ПОДОШЛО (старый формат для совместимости)
-        else:
-            detected = detected_problem or "не указано"
-            conclusion_text = repair_request.get_conclusion_display() if repair_request.conclusion else "не указано"
-            decision_text = repair_request.get_decision_display() if repair_request.decision else "не указано"
-
-            return f"В результате лабораторного исследования выявлено: {detected}\nи принято следующее заключение: {conclusion_text} {decision_text}."
-
-    # Генерируем текст акта
-    act_text = generate_act_text(repair_request)
-
-    # Подготовка данных для шаблона
-    context = {
-        'act_number': f"{repair_request.id}/{timezone.now().strftime('%m/%y')}",
-        'act_date': timezone.now().strftime('%d.%m.%Y'),
-        'product_name': str(repair_request.product),
-        'serial_number': repair_request.serial_number,
-        'received_date': repair_request.created_at.strftime('%d.%m.%Y'),
-        'customer_name': repair_request.customer_name or "Неизвестный клиент",
-        'problem_description': repair_request.problem_description or "не указано",
-
-        # ВАЖНО: передаем сгенерированный текст
-        'act_text': act_text,
-
-        # Оставляем старые поля для совместимости
-        'conclusion': repair_request.get_conclusion_display() if repair_request.conclusion else "не указано",
-        'decision': repair_request.get_decision_display() if repair_request.decision else "не указано",
-        'detected_problem': repair_request.detected_problem or "не указано",
-        'refusal_reason': repair_request.get_refusal_reason_display() if repair_request.refusal_reason else "не указано",
-    }
-
-    # Путь к шаблону
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    template_path = os.path.join(current_dir, 'templates', 'word', 'act_template.docx')
-
-    if not os.path.exists(template_path):
-        return HttpResponse(f"Шаблон не найден: {template_path}", status=404)
-
-    # Загружаем и заполняем шаблон
-    doc = DocxTemplate(template_path)
-    doc.render(context)
-
-    # Сохраняем в память
-    byte_io = BytesIO()
-    doc.save(byte_io)
-    byte_io.seek(0)
+    try:
+        content = render_act_docx(repair_request)
+    except FileNotFoundError:
+        return HttpResponse(f"Шаблон не найден: {ACT_TEMPLATE_PATH}", status=404)
 
-    # Отправляем пользователю
-    response = HttpResponse(
-        byte_io.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-    )
+    response = HttpResponse(content, content_type=ACT_CONTENT_TYPE)
     response['Content-Disposition'] = f'attachment; filename="Акт_№{repair_request.id}.docx"'
-    return response
\ No newline at end of file
+    return response